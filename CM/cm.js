@@ -47,6 +47,8 @@ document.addEventListener('DOMContentLoaded', async () => {
     // Keep track of chart instances
     let monthlyChart = null;
     let categoryChart = null;
+    // Open KPI event stream, closed when filters change
+    let kpiSource = null;
 
     function updateKPIDisplay(kpiData) {
         // Display KPIs with null checks
@@ -171,69 +173,37 @@ document.addEventListener('DOMContentLoaded', async () => {
             }
             // 'all' time period - no date filters needed
 
-            // Fetch data via streaming endpoint
-            console.log('Fetching streaming data from server...');
+            // Server-side rollups arrive as Server-Sent Events: partial
+            // aggregates while the rows are scanned, then a final 'done' event
+            if (kpiSource) kpiSource.close();
+            console.log('Streaming KPI aggregates from server...');
             try {
-                const response = await fetch(`http://localhost:5000/stream_data?${params.toString()}`);
-                if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+                updateKPIDisplay(kpiData);
+                kpiSource = new EventSource(`http://localhost:5000/stream_kpis?${params.toString()}`);
+                const source = kpiSource;
                 
-                // Process streaming response
-                const reader = response.body.getReader();
-                const decoder = new TextDecoder();
-                let buffer = '';
+                source.addEventListener('progress', (event) => {
+                    updateKPIDisplay(JSON.parse(event.data));
+                });
                 
-                while (true) {
-                    const { done, value } = await reader.read();
-                    if (done) break;
-                    
-                    buffer += decoder.decode(value, { stream: true });
-                    
-                    // Process complete lines
-                    const lines = buffer.split('\n');
-                    buffer = lines.pop(); // Save incomplete line for next chunk
-                    
-                    for (const line of lines) {
-                        if (!line.trim()) continue;
-                        
-                        try {
-                            const record = JSON.parse(line);
-                            
-                            // Handle error records
-                            if (record.error) {
-                                console.error('Stream error:', record);
-                                continue;
-                            }
-                            
-                            // Update KPIs incrementally
-                            kpiData.total++;
-                            if (record.status === 'Completed') {
-                                kpiData.closed_percent = ((kpiData.closed_percent || 0) + 1) / kpiData.total * 100;
-                            } else if (record.status === 'Wait for Spare Parts') {
-                                kpiData.waiting_parts_percent = ((kpiData.waiting_parts_percent || 0) + 1) / kpiData.total * 100;
-                            }
-                            // Calculate remaining percentage
-                            kpiData.remaining_percent = 100 - (kpiData.closed_percent + kpiData.waiting_parts_percent);
-                            
-                            // Update monthly counts
-                            const month = record.month || 'Unknown';
-                            kpiData.monthly_closed[month] = (kpiData.monthly_closed[month] || 0) + (record.status === 'Completed' ? 1 : 0);
-                            
-                            // Update category counts
-                            const category = record.Job_type || 'Other';
-                            kpiData.categories[category] = (kpiData.categories[category] || 0) + 1;
-                            
-                            // Update UI periodically (every 10 records)
-                            if (kpiData.total % 10 === 0) {
-                                updateKPIDisplay(kpiData);
-                            }
-                        } catch (e) {
-                            console.error('Error parsing stream record:', e, line);
-                        }
-                    }
-                }
+                source.addEventListener('done', (event) => {
+                    updateKPIDisplay(JSON.parse(event.data));
+                    source.close();
+                });
                 
-                // Final UI update
-                updateKPIDisplay(kpiData);
+                source.addEventListener('error', (event) => {
+                    source.close();
+                    const errorElement = document.getElementById('cm-error');
+                    const details = event.data ? JSON.parse(event.data).details : 'Connection lost';
+                    console.error('Error streaming KPI aggregates:', details);
+                    errorElement.innerHTML = `
+                        <p>Failed to connect to server</p>
+                        <p>Error: ${details}</p>
+                        <p>Make sure the server is running at http://localhost:5000</p>
+                        <p>Check browser console (F12) for details</p>
+                    `;
+                    errorElement.style.color = 'red';
+                });
                 
             } catch (error) {
                 console.error('Error fetching streaming data:', error);
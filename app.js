@@ -82,6 +82,8 @@ document.addEventListener('DOMContentLoaded', () => {
         .then(response => response.json())
         .then(data => {
             document.getElementById('message').innerText = data.message || data.error;
+            // The upload is ingested in the background; follow its progress
+            if (data.job_id) pollUploadJob(data.job_id);
         })
         .catch(error => {
             console.error('Error:', error);
@@ -95,6 +97,36 @@ document.addEventListener('DOMContentLoaded', () => {
    
 });
 
+// Poll an upload job until it finishes, showing its stage and throughput
+async function pollUploadJob(jobId, interval = 1000) {
+    const message = document.getElementById('message');
+    try {
+        const response = await fetch(`/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) throw new Error(job.error);
+
+        if (job.state === 'succeeded') {
+            const { inserted, updated, unchanged, deleted, invalid } = job.result;
+            message.innerText = `Database updated: ${inserted} inserted, ${updated} updated, ` +
+                `${unchanged} unchanged, ${deleted} deleted`;
+            if (invalid) {
+                const verb = job.invalid_rows === 'quarantine' ? 'quarantined' : 'rejected';
+                message.innerText += ` - ${invalid} invalid rows ${verb}`;
+            }
+            fetchTableLengths();
+        } else if (job.state === 'failed') {
+            message.innerText = `${job.error.error}: ${job.error.details}`;
+        } else {
+            const rate = job.rows_per_second ? ` (${job.rows_per_second} rows/s)` : '';
+            message.innerText = `Upload ${job.stage}: ${job.rows_processed} rows${rate}`;
+            setTimeout(() => pollUploadJob(jobId, interval), interval);
+        }
+    } catch (error) {
+        console.error('Upload job error:', error);
+        message.innerText = 'Could not get upload progress.';
+    }
+}
+
 function loadInventory() {
     window.location.href = 'inventory/inventory.html';
 }
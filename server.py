@@ -1,13 +1,43 @@
-from flask import Flask, send_from_directory, jsonify, request
+from flask import Flask, send_from_directory, jsonify, request, Response
+import base64
+import hashlib
 import json
 import os
 import sys
+import time
 import pandas as pd
 import logging
+import multiprocessing
+import queue
 from datetime import datetime, timedelta
 import re
 import sqlite3
+import threading
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
 from flask_cors import CORS
+try:
+    import orjson
+except ImportError:  # Standard library encoder as fallback
+    orjson = None
+try:
+    import openpyxl
+except ImportError:  # .xlsx uploads then go through pd.read_excel
+    openpyxl = None
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:  # openpyxl's read-only reader is used instead
+    CalamineWorkbook = None
+from workorder_processor import (
+    enrich_for_storage_parallel, rules_version, hash_rows,
+    ENRICH_WORKERS, ENRICH_TASK_ROWS, validate_workorders,
+    ENRICHED_COLUMNS, STORAGE_DATE_FORMAT, STATUS_CATEGORIES,
+    classification_cache_stats, invalidate_classification_cache, LRUCache,
+    failure_rule_labels, infer_date_formats, DATE_COLUMNS, workorder_keys
+)
 
 app = Flask(__name__)
 CORS(app)
@@ -15,30 +45,1066 @@ CORS(app)
 # Database setup
 DATABASE = 'main.DB'
 
+# Connection pool settings
+POOL_SIZE = 8
+POOL_TIMEOUT = 30  # seconds to wait for a free connection
+BUSY_TIMEOUT = 30  # seconds SQLite waits on a locked database
+STATEMENT_CACHE_SIZE = 256
+
+# Applied to every pooled connection; WAL lets readers run during uploads
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 64MB page cache
+    "PRAGMA mmap_size=268435456",  # 256MB memory-mapped I/O
+    "PRAGMA temp_store=MEMORY"
+]
+
+class ConnectionPool:
+    """
+    Fixed-size pool of tuned SQLite connections shared across request threads
+    A connection is used by one thread at a time; compiled statements stay
+    cached on it between requests.
+    """
+
+    def __init__(self, database, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+        self._timeouts = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=BUSY_TIMEOUT,
+                               check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Check out a connection, opening one while below the pool size"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise sqlite3.OperationalError(
+                        f"No database connection free after {self.timeout}s"
+                    )
+                waited = time.perf_counter() - started
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time += waited
+                    self._max_wait = max(self._max_wait, waited)
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+
+    def release(self, conn):
+        """Return a connection, discarding any uncommitted work"""
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; commit on success, roll back on error"""
+        conn = self.acquire()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        """Return pool usage and wait counters"""
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'in_use': self._in_use,
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'wait_seconds': self._wait_time,
+                'max_wait_seconds': self._max_wait,
+                'average_wait_seconds': self._wait_time / self._waits if self._waits else 0.0,
+                'timeouts': self._timeouts
+            }
+
+_pool = ConnectionPool(DATABASE)
+
+def db_connection():
+    """Context manager yielding a pooled connection to DATABASE"""
+    return _pool.connection()
+
+# Raw work-order columns as uploaded
+WORKORDER_FIELDS = ['WO_key', 'WO_name', 'Description', 'ETATJOB',
+                    'Jobexec_dt', 'Order_date', 'Start_dt', 'Equipement',
+                    'Job_type', 'Cost_purpose_key', 'Location']
+
+# Persisted enrichment columns and their SQLite types
+ENRICHED_COLUMN_TYPES = {
+    'failure_cause': 'TEXT',
+    'snag_location': 'TEXT',
+    'status': 'TEXT',
+    'creation_date': 'TEXT',
+    'execution_date': 'TEXT',
+    'creation_ts': 'INTEGER',
+    'execution_ts': 'INTEGER',
+    'duration_days': 'REAL',
+    'month': 'TEXT',
+    'quarter': 'TEXT',
+    'year': 'TEXT',
+    'equipment_type': 'TEXT',
+    'rules_version': 'TEXT'
+}
+
+# Declared Workorders schema: raw columns, persisted enrichment and the hash
+# of the raw columns used to detect changed rows on upsert
+WORKORDER_COLUMN_TYPES = {
+    **{field: 'TEXT' for field in WORKORDER_FIELDS},
+    **ENRICHED_COLUMN_TYPES,
+    'row_hash': 'INTEGER'
+}
+
+# Secondary indexes matching the /all_data and /stream_data filter shapes;
+# date ranges are searched on the canonical integer timestamps
+WORKORDER_INDEXES = {
+    'idx_workorders_equipement': ['Equipement'],
+    'idx_workorders_job_type': ['Job_type'],
+    'idx_workorders_etatjob': ['ETATJOB'],
+    'idx_workorders_status': ['status'],
+    'idx_workorders_creation_ts': ['creation_ts'],
+    'idx_workorders_execution_ts': ['execution_ts']
+}
+
+# Dimensions of the KPI rollup cube kept in step with Workorders
+CUBE_DIMENSIONS = ['month', 'equipment_type', 'Equipement', 'status',
+                   'failure_cause', 'Job_type']
+
+# Small bookkeeping tables that /table_lengths counts directly; every other
+# table's count is kept in table_row_counts
+LIVE_COUNT_TABLES = {'app_metadata', 'sqlite_stat1', 'workorder_cube', 'table_row_counts'}
+
+# Upload snapshots: whole-database copies in separate files
+BACKUP_DIR = 'backups'
+BACKUP_KEEP = int(os.environ.get('DASHBOARD_BACKUP_KEEP', 10))  # newest snapshots kept
+# Older snapshots are removed; an empty value keeps them
+BACKUP_MAX_AGE_DAYS = int(os.environ.get('DASHBOARD_BACKUP_MAX_AGE_DAYS', 30) or 0) or None
+
+SNAPSHOT_PATTERN = re.compile(r'^snapshot_(\d{8}T\d{6}_\d{6})\.DB$')
+
+# Rows re-enriched per batch when the rules version changes
+ENRICH_BATCH_SIZE = 5000
+
+# Stored rows sampled to infer date formats for data enriched before they
+# were kept in app_metadata
+DATE_FORMAT_SAMPLE_ROWS = 10000
+
+# Rows per executemany call when writing uploads
+UPSERT_BATCH_SIZE = 5000
+
+# What happens to uploaded rows failing validate_workorders: 'reject' drops
+# them, 'quarantine' also keeps them in Workorders_quarantine
+# (DASHBOARD_INVALID_ROWS, overridable per upload)
+INVALID_ROW_MODES = ('reject', 'quarantine')
+INVALID_ROWS = os.environ.get('DASHBOARD_INVALID_ROWS', 'quarantine')
+
+# Invalid rows listed individually in an upload's validation report
+VALIDATION_REPORT_LIMIT = 100
+
+# Largest accepted upload in MB (DASHBOARD_MAX_UPLOAD_MB); 0 disables the limit
+MAX_UPLOAD_MB = int(os.environ.get('DASHBOARD_MAX_UPLOAD_MB', 1024))
+
+# Rows read, enriched and written per transaction when ingesting a file
+INGEST_CHUNK_ROWS = 50000
+
+# Columns an upload must have; checked against the header before any rows
+REQUIRED_UPLOAD_COLUMNS = ['WO_key', 'WO_name', 'Description', 'ETATJOB',
+                           'Jobexec_dt', 'Order_date', 'Start_dt', 'Equipement']
+
+# Upload columns read as text; the date columns are kept as read for
+# parse_date_column
+UPLOAD_TEXT_COLUMNS = ['WO_key', 'WO_name', 'Description', 'ETATJOB', 'Equipement',
+                       'Job_type', 'Cost_purpose_key', 'Location']
+
+# pandas engine for Excel headers: calamine when installed, else the default
+EXCEL_ENGINE = 'calamine' if CalamineWorkbook is not None else None
+
+# Serializes uploads and re-enrichment so a staged load cannot miss a
+# concurrent write; re-entrant so an upload can refresh stale enrichment
+_ingest_lock = threading.RLock()
+
+# Finished upload jobs kept for /jobs; older ones are forgotten
+INGEST_JOB_HISTORY = 50
+
+# Upload jobs by id, run one at a time by the ingest worker thread
+_ingest_jobs = {}
+_ingest_jobs_lock = threading.Lock()
+_ingest_queue = queue.Queue()
+_ingest_worker = None
+
+# Rows fetched and flushed per NDJSON chunk by /stream_data
+STREAM_CHUNK_SIZE = 5000
+
+# Rows scanned between partial-aggregate events on /stream_kpis
+KPI_EVENT_INTERVAL = 50000
+
+# Filter sets whose KPIs and totals are kept between requests
+KPI_CACHE_SIZE = 256
+
+# KPIs per (data_version, where, params); entries of older versions age out
+_kpi_cache = LRUCache(KPI_CACHE_SIZE)
+
+# Rendered read responses kept between polls
+RESPONSE_CACHE_SIZE = 128
+
+# Responses per (path, params, data version, dataset version, rules version)
+_response_cache = LRUCache(RESPONSE_CACHE_SIZE)
+
+# In-process dataset version, bumped after this process's writes; writes by
+# other processes (a second server, python server.py reenrich) show up
+# through the data_version stored in the database
+_dataset_version = 0
+_dataset_version_lock = threading.Lock()
+
+def workorders_schema(table='Workorders'):
+    """Return the CREATE TABLE statement for the declared Workorders schema"""
+    columns = ',\n'.join(
+        f"    {name} {column_type}" + (' PRIMARY KEY' if name == 'WO_key' else '')
+        for name, column_type in WORKORDER_COLUMN_TYPES.items()
+    )
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n{columns}\n)"
+
+def table_columns(conn, table):
+    """Return the column names of a table"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info('{table}')")]
+
+def ensure_workorders_schema(conn):
+    """
+    Bring Workorders to the declared schema
+    Tables written by older to_sql(if_exists='replace') uploads lose the
+    WO_key primary key; those are rebuilt (last row wins per WO_key) and any
+    missing declared columns are added.
+    """
+    info = conn.execute("PRAGMA table_info('Workorders')").fetchall()
+    if not info:
+        conn.execute(workorders_schema())
+        ensure_workorder_indexes(conn)
+        return
+
+    if not any(row[1] == 'WO_key' and row[5] for row in info):
+        existing = [row[1] for row in info]
+        shared = ', '.join(c for c in WORKORDER_COLUMN_TYPES if c in existing)
+        logging.info("Rebuilding Workorders with the declared schema")
+        conn.execute("DROP TABLE IF EXISTS Workorders_legacy")
+        conn.execute("ALTER TABLE Workorders RENAME TO Workorders_legacy")
+        conn.execute(workorders_schema())
+        conn.execute(f"INSERT OR REPLACE INTO Workorders ({shared}) "
+                     f"SELECT {shared} FROM Workorders_legacy WHERE WO_key IS NOT NULL")
+        conn.execute("DROP TABLE Workorders_legacy")
+        ensure_workorder_indexes(conn)
+        ensure_row_counts_table(conn)
+        store_row_count(conn, 'Workorders')
+        conn.commit()
+        return
+
+    existing = [row[1] for row in info]
+    for column, column_type in WORKORDER_COLUMN_TYPES.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE Workorders ADD COLUMN {column} {column_type}")
+    ensure_workorder_indexes(conn)
+
+def ensure_workorder_indexes(conn, table='Workorders'):
+    """
+    Create any missing WORKORDER_INDEXES on table and drop retired ones
+    Each index may also carry an '_alt' name so a staging table can be
+    indexed while the live table still holds the other name; index names
+    survive the rename that swaps the staging table in.
+    """
+    owners = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type='index' "
+                               "AND name LIKE 'idx_workorders_%'").fetchall())
+    known = set(WORKORDER_INDEXES) | {f"{name}_alt" for name in WORKORDER_INDEXES}
+    for name, owner in owners.items():
+        if owner == table and name not in known:
+            conn.execute(f"DROP INDEX {name}")
+    for name, columns in WORKORDER_INDEXES.items():
+        if table in (owners.get(name), owners.get(f"{name}_alt")):
+            continue
+        free = name if name not in owners else f"{name}_alt"
+        conn.execute(f"CREATE INDEX {free} ON {table} ({', '.join(columns)})")
+
+def ensure_row_counts_table(conn):
+    """Create table_row_counts, which keeps the row count of each table"""
+    conn.execute("CREATE TABLE IF NOT EXISTS table_row_counts "
+                 "(name TEXT PRIMARY KEY, row_count INTEGER NOT NULL)")
+
+def count_rows(conn, table):
+    """Return the exact row count of a table"""
+    quoted = table.replace('"', '""')
+    return conn.execute(f'SELECT COUNT(*) FROM "{quoted}"').fetchone()[0]
+
+def store_row_count(conn, table, count=None):
+    """Record a table's row count, counting it when not given"""
+    if count is None:
+        count = count_rows(conn, table)
+    conn.execute("INSERT OR REPLACE INTO table_row_counts (name, row_count) VALUES (?, ?)",
+                 (table, count))
+
+def adjust_row_count(conn, table, delta):
+    """Add delta to a recorded row count; commits with the caller's write"""
+    if delta:
+        conn.execute("UPDATE table_row_counts SET row_count = row_count + ? WHERE name = ?",
+                     (delta, table))
+
+def table_row_counts(conn, exact=False):
+    """
+    Return {table: rows} for every table
+    Recorded counts are served as-is; tables without one are counted once
+    and recorded. exact=True recounts every table and refreshes the records.
+    """
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    recorded = dict(conn.execute("SELECT name, row_count FROM table_row_counts").fetchall())
+    lengths = {}
+    for table in tables:
+        if table in LIVE_COUNT_TABLES:
+            continue
+        if exact or table not in recorded:
+            lengths[table] = count_rows(conn, table)
+            store_row_count(conn, table, lengths[table])
+        else:
+            lengths[table] = recorded[table]
+    for table in set(recorded) - set(tables):
+        conn.execute("DELETE FROM table_row_counts WHERE name = ?", (table,))
+    # Counted after the records above are written
+    for table in tables:
+        if table in LIVE_COUNT_TABLES:
+            lengths[table] = count_rows(conn, table)
+    return {table: lengths[table] for table in tables}
+
+def get_metadata(conn, key):
+    """Read a value from app_metadata"""
+    row = conn.execute("SELECT value FROM app_metadata WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def set_metadata(conn, key, value):
+    """Write a value to app_metadata"""
+    conn.execute("INSERT OR REPLACE INTO app_metadata (key, value) VALUES (?, ?)", (key, value))
+
+def get_data_version(conn):
+    """Return the Workorders data version, bumped by every write (quarantine included)"""
+    return int(get_metadata(conn, 'data_version') or 0)
+
+def bump_data_version(conn):
+    """Mark Workorders as changed; commits with the caller's transaction"""
+    set_metadata(conn, 'data_version', str(get_data_version(conn) + 1))
+
+def cube_dimension_exprs():
+    """
+    Return (expressions, params) mapping Workorders columns to cube cells
+    Missing values become '' so cells can be keyed; failure causes that are
+    not a rule label (free-text fallbacks) are collapsed into 'Other'.
+    """
+    labels = failure_rule_labels()
+    exprs = []
+    for dimension in CUBE_DIMENSIONS:
+        if dimension == 'failure_cause':
+            exprs.append(f"CASE WHEN failure_cause IN ({', '.join('?' * len(labels))}) "
+                         f"THEN failure_cause ELSE 'Other' END")
+        else:
+            exprs.append(f"COALESCE({dimension}, '')")
+    return exprs, labels
+
+def cube_schema(table='workorder_cube'):
+    """Return the CREATE TABLE statement for the rollup cube"""
+    columns = ', '.join(f"{d} TEXT NOT NULL" for d in CUBE_DIMENSIONS)
+    return (f"CREATE TABLE {table} ({columns}, "
+            f"workorders INTEGER NOT NULL, duration_sum REAL NOT NULL, "
+            f"duration_count INTEGER NOT NULL, "
+            f"PRIMARY KEY ({', '.join(CUBE_DIMENSIONS)}))")
+
+def ensure_cube(conn):
+    """Create workorder_cube, building it from Workorders if it is new"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' "
+                    "AND name='workorder_cube'").fetchone():
+        return
+    conn.execute(cube_schema())
+    rebuild_cube(conn)
+
+def rebuild_cube(conn, table='workorder_cube', source='Workorders'):
+    """Recompute every cube cell from source; commits with the caller"""
+    exprs, params = cube_dimension_exprs()
+    conn.execute(f"DELETE FROM {table}")
+    conn.execute(
+        f"INSERT INTO {table} SELECT {', '.join(exprs)}, COUNT(*), "
+        f"TOTAL(duration_days), COUNT(duration_days) FROM {source} "
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(exprs)))}",
+        params
+    )
+
+def apply_cube_delta(conn, where, where_params, sign):
+    """
+    Add (sign=1) or remove (sign=-1) the selected Workorders rows from the cube
+    Runs inside the caller's write transaction so the cube always matches
+    the committed rows.
+    """
+    exprs, params = cube_dimension_exprs()
+    dimensions = ', '.join(CUBE_DIMENSIONS)
+    conn.execute(
+        f"INSERT INTO workorder_cube SELECT {', '.join(exprs)}, {sign} * COUNT(*), "
+        f"{sign} * TOTAL(duration_days), {sign} * COUNT(duration_days) "
+        f"FROM Workorders WHERE {where} "
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(exprs)))} "
+        f"ON CONFLICT ({dimensions}) DO UPDATE SET "
+        f"workorders = workorders + excluded.workorders, "
+        f"duration_sum = duration_sum + excluded.duration_sum, "
+        f"duration_count = duration_count + excluded.duration_count",
+        params + list(where_params)
+    )
+    if sign < 0:
+        conn.execute("DELETE FROM workorder_cube WHERE workorders = 0")
+
+def refresh_enrichment(conn, force=False, batch_size=ENRICH_BATCH_SIZE, workers=None):
+    """
+    Recompute persisted enrichment columns in batches
+    Args:
+        conn: open database connection
+        force: re-enrich every row, not only rows with a stale rules_version
+        batch_size: rows read and updated per transaction
+        workers: enrichment tasks run at once (default and at most
+            ENRICH_WORKERS); with more than one, batches grow to a task per
+            worker
+    Returns:
+        Number of rows re-enriched
+    """
+    workers = min(workers or ENRICH_WORKERS, ENRICH_WORKERS)
+    if workers > 1:
+        batch_size = max(batch_size, workers * ENRICH_TASK_ROWS)
+    ensure_workorders_schema(conn)
+    ensure_cube(conn)
+    version = rules_version()
+    raw_fields = [f for f in table_columns(conn, 'Workorders') if f in WORKORDER_FIELDS]
+    stale_clause = "" if force else " AND (rules_version IS NULL OR rules_version != ?)"
+    query = (f"SELECT rowid AS row_id, {', '.join(raw_fields)} FROM Workorders "
+             f"WHERE rowid > ?{stale_clause} ORDER BY rowid LIMIT ?")
+    columns = ENRICHED_COLUMNS + ['rules_version']
+    update = (f"UPDATE Workorders SET {', '.join(f'{c} = ?' for c in columns)} "
+              f"WHERE rowid = ?")
+
+    refreshed = 0
+    last_rowid = 0
+    while True:
+        params = [last_rowid] + ([] if force else [version]) + [batch_size]
+        batch = pd.read_sql_query(query, conn, params=params)
+        if batch.empty:
+            break
+        raw = batch.drop(columns=['row_id'])
+        enriched = enrich_for_storage_parallel(raw, workers, date_formats=resolve_date_formats(conn, raw))
+        values = enriched[columns].astype(object).where(enriched[columns].notna(), None)
+        values['row_id'] = batch['row_id'].astype(object)
+        conn.executemany(update, values.itertuples(index=False, name=None))
+        conn.commit()
+        refreshed += len(batch)
+        last_rowid = int(batch['row_id'].iloc[-1])
+
+    set_metadata(conn, 'rules_version', version)
+    if refreshed:
+        # Re-enrichment can move rows between any cells
+        rebuild_cube(conn)
+        bump_data_version(conn)
+    conn.commit()
+    return refreshed
+
+def resolve_date_formats(conn, df=None):
+    """
+    Return the stored {column: format} of the raw date columns
+    Columns without a stored format take the one inferred from df, which is
+    then stored (committing with the caller), so every later chunk, batch
+    and re-enrichment reads ambiguous dates such as 05/01/2024 the same way.
+    """
+    stored = json.loads(get_metadata(conn, 'date_formats') or '{}')
+    if df is None:
+        return stored
+    formats = infer_date_formats(df, stored)
+    if formats != stored:
+        set_metadata(conn, 'date_formats', json.dumps(formats))
+        logging.info(f"Stored date formats: {formats}")
+    return formats
+
+def enrichment_stale(conn):
+    """Whether stored enrichment predates the stored date formats or the current rules"""
+    return (get_metadata(conn, 'date_formats') is None
+            or get_metadata(conn, 'rules_version') != rules_version())
+
+def ensure_enrichment_current(conn):
+    """Re-enrich stale rows if the rules changed since the data was enriched
+
+    Concurrent callers wait on the ingest lock and re-check, so only the
+    first of them runs the refresh.
+    """
+    if not enrichment_stale(conn):
+        return
+    with _ingest_lock:
+        if enrichment_stale(conn):
+            _refresh_stale_enrichment(conn)
+
+def _refresh_stale_enrichment(conn):
+    if get_metadata(conn, 'date_formats') is None:
+        # Rows enriched before formats were stored may each have used a
+        # different guess: store the formats of a sample and re-enrich all
+        fields = [c for c in DATE_COLUMNS if c in table_columns(conn, 'Workorders')]
+        sample = pd.read_sql_query(
+            f"SELECT {', '.join(fields)} FROM Workorders LIMIT ?", conn, params=[DATE_FORMAT_SAMPLE_ROWS]
+        ) if fields else pd.DataFrame()
+        set_metadata(conn, 'date_formats', json.dumps(infer_date_formats(sample)))
+        conn.commit()
+        if not sample.empty:
+            refreshed = refresh_enrichment(conn, force=True)
+            logging.info(f"Re-enriched {refreshed} workorders with stored date formats")
+            return
+    if get_metadata(conn, 'rules_version') != rules_version():
+        refreshed = refresh_enrichment(conn)
+        logging.info(f"Re-enriched {refreshed} workorders for rules version {rules_version()}")
+
+def sqlite_rows(frame):
+    """Convert a DataFrame to a list of tuples of SQLite-bindable values"""
+    columns = []
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dt.strftime(STORAGE_DATE_FORMAT)
+        columns.append(values.astype(object).where(values.notna(), None))
+    return list(zip(*columns))
+
+def ensure_quarantine_table(conn):
+    """Create Workorders_quarantine, which keeps uploaded rows that failed validation"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' "
+                    "AND name='Workorders_quarantine'").fetchone():
+        return
+    columns = ''.join(f",\n    {field} TEXT" for field in WORKORDER_FIELDS)
+    conn.execute(f"""
+        CREATE TABLE Workorders_quarantine (
+            source TEXT,
+            row_number INTEGER,
+            reasons TEXT,
+            quarantined_at TEXT{columns}
+        )
+    """)
+    store_row_count(conn, 'Workorders_quarantine', 0)
+
+def new_validation_report(mode):
+    """Return an empty validation report for an upload"""
+    return {'mode': mode, 'invalid_rows': 0, 'by_reason': Counter(), 'errors': [],
+            'errors_truncated': False}
+
+def record_invalid_rows(conn, rows, reasons, row_numbers, validation, source=None):
+    """
+    Add rows that failed validation to the report, quarantining them if asked
+    Args:
+        conn: open database connection; quarantined rows commit with the caller
+        rows: DataFrame of the invalid rows' workorder columns
+        reasons: Series of '; '-joined reasons for each row
+        row_numbers: spreadsheet row number of each row (the header is row 1)
+        validation: report from new_validation_report(), updated in place
+        source: upload label stored with quarantined rows
+    """
+    validation['invalid_rows'] += len(rows)
+    validation['by_reason'].update(reasons.str.split('; ').explode().value_counts().to_dict())
+    room = VALIDATION_REPORT_LIMIT - len(validation['errors'])
+    validation['errors'].extend(
+        {'row': int(number), 'WO_key': None if pd.isna(key) else key, 'reasons': reason}
+        for number, key, reason in zip(row_numbers[:room], rows['WO_key'][:room], reasons[:room])
+    )
+    validation['errors_truncated'] |= len(rows) > room
+    if validation['mode'] != 'quarantine':
+        return
+    ensure_quarantine_table(conn)
+    quarantined = rows.assign(source=source, row_number=row_numbers, reasons=reasons.to_numpy(),
+                              quarantined_at=datetime.now().strftime(STORAGE_DATE_FORMAT))
+    columns = ['source', 'row_number', 'reasons', 'quarantined_at'] + list(rows.columns)
+    conn.executemany(
+        f"INSERT INTO Workorders_quarantine ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})",
+        sqlite_rows(quarantined[columns])
+    )
+    adjust_row_count(conn, 'Workorders_quarantine', len(rows))
+    # Table lengths served from other processes' response caches are stale
+    bump_data_version(conn)
+
+def ingest_workorders(conn, chunks, replace=False, batch_size=UPSERT_BATCH_SIZE, progress=None,
+                      invalid_rows=INVALID_ROWS, source=None):
+    """
+    Write uploaded work orders into Workorders keyed on WO_key, chunk by chunk
+    Each chunk is hashed and compared with the stored hashes; only new or
+    changed rows are enriched, before any write lock is taken. Upserts are
+    written in one short transaction per chunk, so memory stays bounded by
+    the chunk size; replace stages every chunk and swaps the staging table
+    in once the whole upload is loaded (see swap_in_workorders).
+    Args:
+        conn: open database connection
+        chunks: iterable of DataFrames of uploaded work orders
+        replace: also delete stored rows that are missing from the upload;
+            a key whose uploaded row fails validation keeps its stored row
+        batch_size: rows per executemany call
+        progress: optional callback(stage, rows) told of each stage and of
+            the rows of every written chunk
+        invalid_rows: 'reject' or 'quarantine' rows failing validation
+        source: upload label stored with quarantined rows
+    Returns:
+        Dict with inserted/updated/unchanged/deleted/invalid row counts and
+        the validation report
+    """
+    def report(stage, rows=0):
+        if progress:
+            progress(stage, rows)
+
+    ensure_workorders_schema(conn)
+    ensure_cube(conn)
+    counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    validation = new_validation_report(invalid_rows)
+    rows_read = 0
+
+    # One ingest at a time: a staged load must not miss a concurrent upsert
+    with _ingest_lock:
+        try:
+            if replace:
+                create_workorders_staging(conn)
+            report('parsing')
+            for number, chunk in enumerate(chunks, 1):
+                started = time.perf_counter()
+                report('validating')
+                if number == 1:
+                    ignored = [c for c in chunk.columns if c not in WORKORDER_COLUMN_TYPES]
+                    if ignored:
+                        logging.info(f"Ignoring columns not in the Workorders schema: {ignored}")
+                fields = [f for f in WORKORDER_FIELDS if f in chunk.columns]
+                read = len(chunk)
+                first_row = rows_read + 2
+                rows_read += read
+
+                # Invalid rows are reported (and quarantined) instead of written
+                formats = resolve_date_formats(conn, chunk)
+                reasons, dates = validate_workorders(chunk[fields], formats)
+                # Enrichment reuses the dates parsed here, matched on the index
+                if not chunk.index.is_unique:
+                    dates = None
+                invalid = (reasons != '').to_numpy()
+                # Keys in stored form, read as validation read them
+                keys = workorder_keys(chunk['WO_key'])
+                if invalid.any():
+                    record_invalid_rows(conn, chunk.loc[invalid, fields], reasons[invalid],
+                                        first_row + invalid.nonzero()[0], validation, source)
+                    if replace:
+                        keep_stored_workorders(conn, keys[invalid])
+                    conn.commit()
+                # Rows without a key or superseded by a later one are invalid,
+                # so every key left is present and unique
+                df = chunk.loc[~invalid, fields].assign(WO_key=keys[~invalid])
+                if df.empty:
+                    report('parsing', read)
+                    continue
+                df['row_hash'] = hash_rows(df, fields)
+                columns = fields + ENRICHED_COLUMNS + ['rules_version', 'row_hash']
+
+                # Compare against stored hashes through the WO_key primary key
+                conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_keys "
+                             "(WO_key TEXT PRIMARY KEY, row_hash INTEGER)")
+                conn.execute("DELETE FROM incoming_keys")
+                conn.executemany("INSERT INTO incoming_keys VALUES (?, ?)",
+                                 sqlite_rows(df[['WO_key', 'row_hash']]))
+                # Only new or changed keys come back, so this is sized by the change
+                differing = conn.execute(
+                    "SELECT i.WO_key, w.WO_key IS NOT NULL FROM incoming_keys i "
+                    "LEFT JOIN Workorders w ON w.WO_key = i.WO_key "
+                    "WHERE w.row_hash IS NOT i.row_hash"
+                ).fetchall()
+                updated_keys = {key for key, exists in differing if exists}
+                changed = df[df['WO_key'].isin({key for key, _ in differing})]
+                # Enrichment runs outside any transaction on the main database
+                conn.commit()
+                report('enriching')
+                rows = (sqlite_rows(enrich_for_storage_parallel(
+                            changed, date_formats=formats, parsed_dates=dates)[columns])
+                        if not changed.empty else [])
+
+                report('writing')
+                if replace:
+                    stage_workorder_chunk(conn, columns, rows, batch_size)
+                else:
+                    write_workorder_changes(conn, columns, rows, updated_keys, batch_size)
+                    counts['inserted'] += len(differing) - len(updated_keys)
+                    counts['updated'] += len(updated_keys)
+                    counts['unchanged'] += len(df) - len(differing)
+                conn.execute("DELETE FROM incoming_keys")
+                conn.commit()
+                logging.info(f"Ingested chunk {number}: {len(df)} rows, {len(differing)} new or "
+                             f"changed in {time.perf_counter() - started:.2f}s")
+                report('parsing', read)
+
+            report('indexing')
+            if replace:
+                counts = swap_in_workorders(conn)
+        except Exception:
+            conn.rollback()
+            if replace:
+                conn.execute("DROP TABLE IF EXISTS Workorders_staging")
+                conn.execute("DROP TABLE IF EXISTS workorder_cube_staging")
+                conn.commit()
+            raise
+
+    if validation['invalid_rows']:
+        logging.warning(f"{validation['invalid_rows']} uploaded rows failed validation "
+                        f"({validation['mode']}): {dict(validation['by_reason'])}")
+
+    # Rows kept as-is may predate a rules change
+    ensure_enrichment_current(conn)
+    # Refresh planner statistics so the most selective index is chosen
+    if counts['inserted'] or counts['updated'] or counts['deleted']:
+        conn.execute("ANALYZE Workorders")
+        conn.commit()
+    validation['by_reason'] = dict(validation['by_reason'])
+    return {**counts, 'invalid': validation['invalid_rows'], 'validation': validation}
+
+def upsert_workorders(conn, df, replace=False, batch_size=UPSERT_BATCH_SIZE,
+                      invalid_rows=INVALID_ROWS):
+    """Write one DataFrame of uploaded work orders (see ingest_workorders)"""
+    return ingest_workorders(conn, [df], replace=replace, batch_size=batch_size,
+                             invalid_rows=invalid_rows)
+
+def write_workorder_changes(conn, columns, rows, updated_keys, batch_size):
+    """
+    Upsert enriched rows into Workorders and the cube in one transaction
+    Args:
+        conn: connection with the upload's keys in incoming_keys
+        columns: column names of the row tuples
+        rows: enriched new or changed rows
+        updated_keys: keys among rows that already exist
+        batch_size: rows per executemany call
+    """
+    if not rows:
+        return
+    # Take the stored versions of changed rows out of the cube; the written
+    # versions are added back below
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS changed_keys (WO_key TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM changed_keys")
+    conn.executemany("INSERT INTO changed_keys VALUES (?)", [(key,) for key in updated_keys])
+    apply_cube_delta(conn, "WO_key IN (SELECT WO_key FROM changed_keys)", [], -1)
+
+    statement = (
+        f"INSERT INTO Workorders ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))}) "
+        f"ON CONFLICT(WO_key) DO UPDATE SET "
+        + ', '.join(f"{c} = excluded.{c}" for c in columns if c != 'WO_key')
+    )
+    for start in range(0, len(rows), batch_size):
+        conn.executemany(statement, rows[start:start + batch_size])
+
+    key_index = columns.index('WO_key')
+    conn.executemany("INSERT OR IGNORE INTO changed_keys VALUES (?)",
+                     [(row[key_index],) for row in rows])
+    apply_cube_delta(conn, "WO_key IN (SELECT WO_key FROM changed_keys)", [], 1)
+    conn.execute("DELETE FROM changed_keys")
+    adjust_row_count(conn, 'Workorders', len(rows) - len(updated_keys))
+    bump_data_version(conn)
+
+def create_workorders_staging(conn):
+    """Create an empty Workorders_staging table for a replace upload"""
+    conn.execute("DROP TABLE IF EXISTS Workorders_staging")
+    conn.execute("DROP TABLE IF EXISTS workorder_cube_staging")
+    conn.execute(workorders_schema('Workorders_staging'))
+    conn.commit()
+
+def stage_workorder_chunk(conn, columns, rows, batch_size):
+    """
+    Add one chunk of a replace upload to Workorders_staging in one transaction
+    Unchanged rows are copied with their stored enrichment; a key repeated in
+    a later chunk replaces the earlier row.
+    Args:
+        conn: connection with the chunk's keys in incoming_keys
+        columns: column names of the row tuples
+        rows: enriched new or changed rows
+        batch_size: rows per executemany call
+    """
+    conn.execute(
+        f"INSERT OR REPLACE INTO Workorders_staging ({', '.join(WORKORDER_COLUMN_TYPES)}) "
+        f"SELECT {', '.join(f'w.{c}' for c in WORKORDER_COLUMN_TYPES)} FROM Workorders w "
+        f"JOIN incoming_keys i ON i.WO_key = w.WO_key AND i.row_hash = w.row_hash"
+    )
+    statement = (f"INSERT OR REPLACE INTO Workorders_staging ({', '.join(columns)}) "
+                 f"VALUES ({', '.join('?' * len(columns))})")
+    for start in range(0, len(rows), batch_size):
+        conn.executemany(statement, rows[start:start + batch_size])
+
+def keep_stored_workorders(conn, keys):
+    """
+    Stage the stored rows of keys whose uploaded rows failed validation
+    A replace upload would otherwise delete them along with the rows missing
+    from the file. Keys already staged keep their staged row.
+    Args:
+        conn: open database connection; rows commit with the caller
+        keys: Series of WO_key values in stored form (see workorder_keys)
+    """
+    conn.executemany(
+        f"INSERT OR IGNORE INTO Workorders_staging ({', '.join(WORKORDER_COLUMN_TYPES)}) "
+        f"SELECT {', '.join(WORKORDER_COLUMN_TYPES)} FROM Workorders WHERE WO_key = ?",
+        [(key,) for key in keys.dropna()]
+    )
+
+def swap_in_workorders(conn):
+    """
+    Replace Workorders with the fully staged upload
+    Workorders_staging is indexed and given its own cube in separate short
+    transactions, while readers keep using the current tables. The swap
+    itself is two renames per table in one transaction.
+    Args:
+        conn: connection with the whole upload in Workorders_staging
+    Returns:
+        Dict with inserted/updated/unchanged/deleted row counts
+    """
+    inserted, updated, unchanged = conn.execute(
+        "SELECT COUNT(*) - COUNT(w.WO_key), "
+        "COALESCE(SUM(w.WO_key IS NOT NULL AND w.row_hash IS NOT s.row_hash), 0), "
+        "COALESCE(SUM(w.row_hash IS s.row_hash), 0) "
+        "FROM Workorders_staging s LEFT JOIN Workorders w ON w.WO_key = s.WO_key"
+    ).fetchone()
+    deleted = conn.execute(
+        "SELECT COUNT(*) FROM Workorders w WHERE NOT EXISTS "
+        "(SELECT 1 FROM Workorders_staging s WHERE s.WO_key = w.WO_key)"
+    ).fetchone()[0]
+    counts = {'inserted': inserted, 'updated': updated, 'unchanged': unchanged, 'deleted': deleted}
+    if not inserted and not updated and not deleted:
+        conn.execute("DROP TABLE Workorders_staging")
+        conn.commit()
+        return counts
+
+    ensure_workorder_indexes(conn, 'Workorders_staging')
+    conn.execute(cube_schema('workorder_cube_staging'))
+    rebuild_cube(conn, 'workorder_cube_staging', 'Workorders_staging')
+    staged = conn.execute("SELECT COUNT(*) FROM Workorders_staging").fetchone()[0]
+    conn.commit()
+
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("ALTER TABLE Workorders RENAME TO Workorders_previous")
+    conn.execute("ALTER TABLE Workorders_staging RENAME TO Workorders")
+    conn.execute("ALTER TABLE workorder_cube RENAME TO workorder_cube_previous")
+    conn.execute("ALTER TABLE workorder_cube_staging RENAME TO workorder_cube")
+    store_row_count(conn, 'Workorders', staged)
+    bump_data_version(conn)
+    conn.commit()
+    logging.info(f"Swapped in {staged} staged workorders; write lock held "
+                 f"{(time.perf_counter() - started) * 1000:.1f}ms")
+
+    # Readers still on the old snapshot keep their pages until they finish
+    conn.execute("DROP TABLE Workorders_previous")
+    conn.execute("DROP TABLE workorder_cube_previous")
+    conn.commit()
+    return counts
+
+def snapshot_path(name):
+    """Return the file path of a snapshot name"""
+    return os.path.join(BACKUP_DIR, name)
+
+def new_snapshot_path(created=None):
+    """Return the file path for a snapshot taken at created (default now)"""
+    created = created or datetime.now()
+    return snapshot_path(f"snapshot_{created.strftime('%Y%m%dT%H%M%S_%f')}.DB")
+
+def list_snapshots():
+    """Return snapshots newest first, as dicts with name, created and size"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    snapshots = []
+    for name in os.listdir(BACKUP_DIR):
+        match = SNAPSHOT_PATTERN.match(name)
+        if match:
+            snapshots.append({
+                'name': name,
+                'created': datetime.strptime(match.group(1), '%Y%m%dT%H%M%S_%f').isoformat(),
+                'size': os.path.getsize(snapshot_path(name))
+            })
+    return sorted(snapshots, key=lambda snapshot: snapshot['name'], reverse=True)
+
+def expired_snapshots(keep=None, max_age_days=None):
+    """
+    Names of snapshots beyond the newest `keep` or older than `max_age_days`
+    The newest snapshot is never expired.
+    Args:
+        keep: snapshots kept, BACKUP_KEEP by default
+        max_age_days: maximum snapshot age, BACKUP_MAX_AGE_DAYS by default
+    """
+    keep = BACKUP_KEEP if keep is None else keep
+    max_age_days = BACKUP_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    cutoff = datetime.now() - timedelta(days=max_age_days) if max_age_days is not None else None
+    expired = []
+    for index, snapshot in enumerate(list_snapshots()):
+        if index == 0:
+            continue
+        too_old = cutoff is not None and datetime.fromisoformat(snapshot['created']) < cutoff
+        if index >= keep or too_old:
+            expired.append(snapshot['name'])
+    return expired
+
+def apply_backup_retention(keep=None, max_age_days=None):
+    """
+    Delete the snapshots expired_snapshots() selects
+    Returns:
+        Names of the deleted snapshots
+    """
+    removed = expired_snapshots(keep, max_age_days)
+    for name in removed:
+        os.remove(snapshot_path(name))
+    if removed:
+        logging.info(f"Removed {len(removed)} snapshots past retention: {removed}")
+    return removed
+
+def create_snapshot(conn, prune=True):
+    """
+    Copy the whole database to a new snapshot file and apply retention
+    Uses the SQLite online backup API, so readers are not blocked.
+    Args:
+        conn: open database connection
+        prune: apply retention once the snapshot is written
+    Returns:
+        Name of the new snapshot
+    """
+    conn.commit()
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    path = new_snapshot_path()
+    target = sqlite3.connect(path)
+    try:
+        conn.backup(target)
+    finally:
+        target.close()
+    if prune:
+        apply_backup_retention()
+    return os.path.basename(path)
+
+def restore_snapshot(conn, name):
+    """
+    Replace the database contents with a snapshot
+    The current contents are snapshotted first so a restore can be undone.
+    Args:
+        conn: open database connection
+        name: snapshot name from list_snapshots()
+    Returns:
+        Name of the snapshot taken before restoring
+    Raises:
+        FileNotFoundError: if no snapshot has that name
+    """
+    # An upload running alongside would write into the replaced database
+    with _ingest_lock:
+        if name not in [snapshot['name'] for snapshot in list_snapshots()]:
+            raise FileNotFoundError(f"No snapshot named {name}")
+        # Read-only, so a missing file is an error rather than a new empty
+        # database copied over the live one
+        source = sqlite3.connect(f"{Path(snapshot_path(name)).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            # Retention waits until the restore is done: it could otherwise
+            # delete the snapshot being restored
+            previous = create_snapshot(conn, prune=False)
+            version = get_data_version(conn)
+            source.backup(conn)
+        finally:
+            source.close()
+        apply_backup_retention()
+
+        # Snapshots migrated from backup tables hold only Workorders
+        ensure_database_schema(conn)
+        # Never reuse a data version that described other contents
+        set_metadata(conn, 'data_version', str(max(version, get_data_version(conn)) + 1))
+        conn.commit()
+        ensure_enrichment_current(conn)
+    return previous
+
+def migrate_backup_tables(conn):
+    """
+    Move legacy Workorders_backup_<ts> tables into snapshot files
+    Migrated snapshots are not pruned here; the next upload applies
+    retention to them like any other snapshot.
+    """
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'Workorders_backup_%'"
+    ).fetchall()]
+    if not tables:
+        return
+    conn.commit()
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    for table in tables:
+        stamp = table.rsplit('_', 1)[1]
+        created = datetime.fromtimestamp(int(stamp)) if stamp.isdigit() else datetime.now()
+        path = new_snapshot_path(created)
+        if not os.path.exists(path):
+            conn.execute("ATTACH DATABASE ? AS snapshot", (path,))
+            try:
+                conn.execute(f"CREATE TABLE snapshot.Workorders AS SELECT * FROM main.{table}")
+            finally:
+                conn.execute("DETACH DATABASE snapshot")
+        conn.execute(f"DROP TABLE {table}")
+        logging.info(f"Moved backup table {table} to {path}")
+    # Give the freed pages back to the filesystem
+    conn.execute("VACUUM")
+    expiring = expired_snapshots()
+    if expiring:
+        logging.warning(
+            f"{len(expiring)} migrated snapshots are past retention and will be removed by the next upload; "
+            f"raise DASHBOARD_BACKUP_KEEP or DASHBOARD_BACKUP_MAX_AGE_DAYS to keep them: {expiring}"
+        )
+
+def ensure_database_schema(conn):
+    """Create or upgrade every application table"""
+    ensure_row_counts_table(conn)
+    ensure_workorders_schema(conn)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS app_metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    ensure_cube(conn)
+
 def create_tables():
     try:
         logging.info("Starting database initialization...")
         logging.info(f"Attempting to connect to database: {os.path.abspath(DATABASE)}")
         logging.info(f"Current working directory: {os.getcwd()}")
         logging.info(f"Directory permissions: {os.access(os.getcwd(), os.W_OK)}")
-        conn = sqlite3.connect(DATABASE)
+        conn = _pool.acquire()
         cursor = conn.cursor()
         logging.info("Database connection successful")
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Workorders (
-                WO_key TEXT PRIMARY KEY,
-                WO_name TEXT,
-                Description TEXT,
-                ETATJOB TEXT,
-                Jobexec_dt TEXT,
-                Order_date TEXT,
-                Start_dt TEXT,
-                Equipement TEXT,
-                Job_type TEXT,
-                Cost_purpose_key TEXT
-            )
-        ''')
+        ensure_database_schema(conn)
         logging.info("Table creation/verification successful")
 
         # Verify table exists
@@ -48,243 +1114,490 @@ def create_tables():
             raise Exception("Workorders table not created")
 
         conn.commit()
-        conn.close()
+        migrate_backup_tables(conn)
+        # Refresh enrichment left stale by a rules change before serving
+        ensure_enrichment_current(conn)
+        _pool.release(conn)
         logging.info("Database operations completed successfully")
     except Exception as e:
         logging.error(f"Database error: {str(e)}", exc_info=True)
         raise
 
-create_tables()
+# Enrichment worker processes re-import the main script; only the server
+# process itself initializes the database
+if multiprocessing.current_process().name == 'MainProcess':
+    create_tables()
+
+def read_upload_header(source, filename):
+    """Return the column names of an uploaded file without reading its rows"""
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        return [str(column) for column in pd.read_excel(source, nrows=0, engine=EXCEL_ENGINE).columns]
+    return list(pd.read_csv(source, nrows=0).columns)
+
+def cell_text(value):
+    """Return a spreadsheet cell as text, or None when blank"""
+    if value is None or value == '' or value != value:
+        return None
+    # Spreadsheets store numbers as floats: key 1234 must not become '1234.0'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def timed_chunks(chunks, label):
+    """Pass chunks through, logging the rows read and the time spent reading"""
+    rows = 0
+    seconds = 0.0
+    started = time.perf_counter()
+    for chunk in chunks:
+        seconds += time.perf_counter() - started
+        rows += len(chunk)
+        yield chunk
+        started = time.perf_counter()
+    seconds += time.perf_counter() - started
+    logging.info(f"Parsed {label}: {rows} rows in {seconds:.2f}s "
+                 f"({rows / seconds if seconds else 0:.0f} rows/s)")
+
+def iter_excel_chunks(source, filename, chunk_rows):
+    """
+    Yield the first sheet of an Excel upload as DataFrames of chunk_rows rows
+    Rows come from calamine when it is installed, else from a read-only
+    openpyxl workbook. Only WORKORDER_FIELDS columns are kept, text columns
+    are converted per UPLOAD_TEXT_COLUMNS and dates are left as read.
+    """
+    if CalamineWorkbook is not None:
+        workbook = CalamineWorkbook.from_object(source)
+        sheet = workbook.get_sheet_by_index(0)
+        sheet_name, rows = sheet.name, sheet.iter_rows()
+    else:
+        workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+        sheet = workbook.worksheets[0]
+        sheet_name, rows = sheet.title, sheet.iter_rows(values_only=True)
+
+    def batches():
+        header = [cell_text(value) for value in next(rows, ())]
+        keep = [index for index, name in enumerate(header)
+                if name in WORKORDER_FIELDS and name not in header[:index]]
+        columns = [header[index] for index in keep]
+        batch = []
+        for row in rows:
+            # Rows may be short when trailing cells are empty
+            values = [row[index] if index < len(row) else None for index in keep]
+            # Blank rows (formatted but empty, or past the data) are skipped,
+            # as pandas' readers skip them
+            if all(cell_text(value) is None for value in values):
+                continue
+            batch.append(values)
+            if len(batch) == chunk_rows:
+                yield upload_frame(batch, columns)
+                batch = []
+        if batch:
+            yield upload_frame(batch, columns)
+
+    try:
+        yield from timed_chunks(batches(), f"sheet '{sheet_name}' of {filename} "
+                                           f"with {EXCEL_ENGINE or 'openpyxl'}")
+    finally:
+        # Older python-calamine releases keep the file until collected
+        if hasattr(workbook, 'close'):
+            workbook.close()
+
+def upload_frame(rows, columns):
+    """Build a DataFrame from spreadsheet rows with the upload column types"""
+    df = pd.DataFrame(rows, columns=columns, dtype=object)
+    for column in df.columns:
+        if column in UPLOAD_TEXT_COLUMNS:
+            df[column] = df[column].map(cell_text)
+        else:  # Dates are parsed by the enrichment stage
+            df[column] = df[column].where(df[column] != '', None)
+    return df
+
+def iter_upload_chunks(source, filename, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Yield the rows of an uploaded file as DataFrames of at most chunk_rows rows
+    CSV goes through a chunked reader and Excel through a row-streaming
+    workbook reader (see iter_excel_chunks), so memory is bounded by the chunk
+    size. Without calamine, .xls files (at most 65536 rows) are read whole,
+    then split. Only WORKORDER_FIELDS columns are read.
+    Args:
+        source: path or file object of the upload
+        filename: original name, used to tell Excel from CSV
+        chunk_rows: rows per yielded DataFrame
+    """
+    name = filename.lower()
+    wanted = lambda column: column in WORKORDER_FIELDS
+    text_dtypes = {column: str for column in UPLOAD_TEXT_COLUMNS}
+    # Dates stay text too: pandas would type each CSV chunk on its own, turning
+    # a chunk of serials into floats and the next one into strings
+    csv_dtypes = {**text_dtypes, **{column: str for column in DATE_COLUMNS}}
+    if name.endswith(('.xlsx', '.xls')) and (CalamineWorkbook is not None
+                                             or (name.endswith('.xlsx') and openpyxl is not None)):
+        yield from iter_excel_chunks(source, filename, chunk_rows)
+    elif name.endswith(('.xlsx', '.xls')):
+        started = time.perf_counter()
+        df = pd.read_excel(source, usecols=wanted, dtype=text_dtypes)
+        logging.info(f"Parsed first sheet of {filename}: {len(df)} rows in "
+                     f"{time.perf_counter() - started:.2f}s")
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+    else:  # CSV
+        # Keys stay text so a chunk with blank keys does not turn them into floats
+        with pd.read_csv(source, chunksize=chunk_rows, usecols=wanted,
+                         dtype=csv_dtypes) as reader:
+            yield from timed_chunks(reader, filename)
+
+def ingest_job_status(job):
+    """Return a copy of an upload job with its throughput"""
+    status = dict(job)
+    if job['started']:
+        elapsed = (job['finished'] or time.time()) - job['started']
+        status['elapsed_seconds'] = round(elapsed, 2)
+        status['rows_per_second'] = round(job['rows_processed'] / elapsed) if elapsed else 0
+    for field in ('submitted', 'started', 'finished'):
+        if job[field]:
+            status[field] = datetime.fromtimestamp(job[field]).isoformat()
+    return status
+
+def update_ingest_job(job_id, **fields):
+    """Update fields of an upload job"""
+    with _ingest_jobs_lock:
+        _ingest_jobs[job_id].update(fields)
+
+def run_ingest_job(job_id, temp_path, filename, replace, invalid_rows=INVALID_ROWS):
+    """
+    Snapshot the database and ingest one uploaded file, recording progress
+    The temp file is removed when the job ends, whatever the outcome.
+    """
+    def progress(stage, rows):
+        with _ingest_jobs_lock:
+            job = _ingest_jobs[job_id]
+            job['stage'] = stage
+            job['rows_processed'] += rows
+
+    update_ingest_job(job_id, state='running', stage='backup', started=time.time())
+    try:
+        with db_connection() as conn:
+            # Snapshot current data to a separate file
+            backup = create_snapshot(conn)
+            logging.info(f"Created backup snapshot: {backup}")
+            update_ingest_job(job_id, backup=backup)
+
+            # Upsert new/changed rows chunk by chunk (mode=replace also
+            # removes rows missing from the file); enrichment happens here,
+            # not on reads
+            counts = ingest_workorders(conn, iter_upload_chunks(temp_path, filename),
+                                       replace=replace, progress=progress,
+                                       invalid_rows=invalid_rows, source=f"{filename} (job {job_id})")
+            logging.info(f"Upsert of {filename}: {counts}")
+
+            new_count = table_row_counts(conn)['Workorders']
+            logging.info(f"Database updated - new record count: {new_count}")
+        update_ingest_job(job_id, state='succeeded', stage='done', finished=time.time(),
+                          result={**counts, 'records_updated': new_count})
+    except Exception as e:
+        logging.error(f"Database update failed for {filename}: {str(e)}", exc_info=True)
+        # Each chunk is written in its own transaction: an upsert keeps the
+        # chunks written before the failure, a replace leaves Workorders
+        # as it was. The snapshot taken above holds the previous contents.
+        update_ingest_job(job_id, state='failed', finished=time.time(), error={
+            'error': 'Failed to update database',
+            'details': str(e),
+            'code': 'DATABASE_UPDATE_FAILED'
+        })
+    finally:
+        # A failed job may still have committed chunks or quarantined rows
+        invalidate_response_cache()
+        try:
+            os.remove(temp_path)
+        except OSError as e:
+            logging.warning(f"Failed to clean up temp file {temp_path}: {str(e)}")
+
+def ingest_worker():
+    """Run queued upload jobs one at a time, forever"""
+    while True:
+        job_id, temp_path, filename, replace, invalid_rows = _ingest_queue.get()
+        try:
+            run_ingest_job(job_id, temp_path, filename, replace, invalid_rows)
+        finally:
+            _ingest_queue.task_done()
+
+def new_ingest_job_id():
+    """Return a fresh upload job id"""
+    return uuid.uuid4().hex
+
+def submit_ingest_job(job_id, temp_path, filename, replace, invalid_rows=INVALID_ROWS):
+    """
+    Queue an uploaded file for the ingest worker, starting it if needed
+    Args:
+        job_id: id from new_ingest_job_id()
+        temp_path: saved upload, owned (and removed) by the job
+        filename: original file name
+        replace: replace mode instead of upsert
+        invalid_rows: 'reject' or 'quarantine' rows failing validation
+    Returns:
+        Status dict of the queued job
+    """
+    global _ingest_worker
+    job = {
+        'id': job_id,
+        'filename': filename,
+        'mode': 'replace' if replace else 'upsert',
+        'invalid_rows': invalid_rows,
+        'state': 'queued',
+        'stage': 'queued',
+        'rows_processed': 0,
+        'submitted': time.time(),
+        'started': None,
+        'finished': None,
+        'backup': None,
+        'result': None,
+        'error': None
+    }
+    with _ingest_jobs_lock:
+        _ingest_jobs[job_id] = job
+        # Forget the oldest finished jobs beyond the history size
+        finished = [key for key, value in _ingest_jobs.items() if value['finished']]
+        for key in finished[:max(0, len(finished) - INGEST_JOB_HISTORY)]:
+            del _ingest_jobs[key]
+        if _ingest_worker is None or not _ingest_worker.is_alive():
+            _ingest_worker = threading.Thread(target=ingest_worker, name='ingest-worker', daemon=True)
+            _ingest_worker.start()
+        status = ingest_job_status(job)
+    _ingest_queue.put((job_id, temp_path, filename, replace, invalid_rows))
+    return status
 
 def update_database(data_file):
     try:
-        if data_file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(data_file)
-        else:  # CSV
-            df = pd.read_csv(data_file)
-        conn = sqlite3.connect(DATABASE)
-        df.to_sql('Workorders', conn, if_exists='replace', index=False)
-        conn.close()
+        with db_connection() as conn:
+            ingest_workorders(conn, iter_upload_chunks(data_file, data_file.filename))
         return True
     except Exception as e:
         print(f"Error updating database: {e}")
         return False
 
-def classify_failure(cause):
-    """Classify failure type based on description text"""
-    if not cause:
-        return cause
-        
-    d = str(cause).strip().upper()
-    
-    if "TWIN" in d: return "twin"
-    if "TELESC" in d: return "Telescopy"
-    if any(x in d for x in ["NOISE", "DAMAGE", "BRUIT", "ENDOMMA", "VIBRE"]): 
-        return "Mech fail"
-    if "AC FAULT" in d: return "A/C"
-    if any(x in d for x in ["SIÈGE", "SEAT"]): return "operator seat"
-    if "CRANE OF" in d: return "Crane off"
-    if any(x in d for x in ["DRIVE OF", "CONTROL OF", "CONTROLE OF", "ALM"]): 
-        return "Drive Off"
-    if "POWER" in d: return "Power cut off"
-    if any(x in d for x in ["ROOF", "TTDS", "SPREADER READY"]): 
-        return "spreader ready intrlck"
-    if "DOMMAGE" in d: return "Incident_Dommage"
-    if any(x in d for x in ["HOIST BRAKE", "HOIST SERVICE BRAKE"]): 
-        return "Hoist service brake"
-    if "HOIST EMERG" in d: return "Hoist Emergency brake"
-    if any(x in d for x in ["HDB", "HEADBLOCK"]): return "Headblock"
-    if "FESTOON" in d: return "Festoon"
-    if "HOIST SLOW" in d: return "Hoist slowdown"
-    if "AFFICHEUR" in d: return "Display"
-    if "GANTRY DRIVE" in d: return "Gantry drive"
-    if "GANTRY POSITION" in d: return "Gantry position"
-    if "GANTRY WHEEL" in d: return "Gantry wheel brake"
-    if "GANTRY BRAKE" in d: return "Gantry brake"
-    if "GANTRY ENCODER" in d: return "Gantry encoder"
-    if "GANTRY MOTOR" in d: return "Gantry motor"
-    if "TROLLEY DRIVE" in d: return "Trolley drive"
-    if "TROLLEY POSITION" in d: return "Trolley position"
-    if "TROLLEY BRAKE" in d: return "Trolley brake"
-    if "TROLLEY GATE" in d: return "Trolley gate"
-    if "TROLLEY ROPE" in d: return "Trolley rope tension"
-    if "HOIST DRIVE" in d: return "hoist drive"
-    if "HOIST POSITION" in d: return "hoist position"
-    if "HOIST WIRE" in d: return "hoist wire rope"
-    if "HOIST ENCODER" in d: return "Hoist encoder"
-    if "HOIST MOTOR" in d: return "Hoist motor"
-    if "GCR" in d: return "GCR"
-    if any(x in d for x in ["SCR", "SPREADER CABLE REEL"]): return "SCR"
-    if any(x in d for x in ["BAD STACK", "COINC", "SPREADER BLOQUÉ", 
-                           "SPREADER ACCROCHÉ", "STUCK"]): return "Stuck"
-    if any(x in d for x in ["BLINK FAULT", "COMMUNICA", "COMUNICA", "LIGHT BLINK"]): 
-        return "Communication"
-    if any(x in d for x in ["BOOM ISSUE", "BOOM FAULT", "BOOM INV"]): return "Boom Drive"
-    if any(x in d for x in ["BOOM LEVEL", "BOOM DOWN", "BOOM UP", "NO BOOM"]): 
-        return "Boom position"
-    if "TLS" in d: return "TLS fault"
-    if any(x in d for x in ["CHANGE", "CHANGEMENT"]): return "spreader change"
-    if any(x in d for x in ["JOYSTICK", "JOYSTI"]): return "Joystick fault"
-    if any(x in d for x in ["CONNECTOR", "PLUG"]): return "spreader plug"
-    if any(x in d for x in ["FUITE D'HUILE", "OIL LEAK"]): return "oil leakage"
-    if any(x in d for x in ["DÉVÉRROU", "VÉRROU", "LOCK FAULT", "UNLOCK", 
-                           "UNLOPK", "LOCKING FAULT"]): return "Lock/unlock"
-    if "FLIPPER" in d: return "Flipper"
-    if any(x in d for x in ["TELESCOP", "TELECO", "TELSCO"]): return "Telescopic"
-    if any(x in d for x in ["LIGHTS", "LIGHT", "LIGHT FAULT", "LIGHT ISSUE", 
-                           "LIGHT OFF", "LAMPE", "FLOODLIGHT"]): return "Light"
-    if any(x in d for x in ["POMPE SPREADER", "SPREADER PUMP", "PUMP"]): 
-        return "spreader pump"
-    
-    return cause
+def workorder_select_fields(conn, fields=None):
+    """
+    Build the SELECT list for Workorders reads
+    Requested raw fields are validated against WORKORDER_FIELDS and the table;
+    the persisted enrichment columns are always included.
+    """
+    existing = table_columns(conn, 'Workorders')
+    field_list = [f for f in WORKORDER_FIELDS if f in existing]
+    if fields:
+        requested = [f.strip() for f in fields.split(',')]
+        field_list = [f for f in requested if f in field_list]
+    selected = ['CAST(WO_key AS TEXT) AS WO_key' if f == 'WO_key' else f for f in field_list]
+    return ', '.join(selected + list(ENRICHED_COLUMN_TYPES))
 
-def find_snag_location(short):
-    """Determine snag location based on description text"""
-    if not short:
-        return ""
-        
-    s = str(short).upper()
+def date_filter_timestamp(value, end_of_day=False):
+    """
+    Convert a date filter value to seconds since 1970-01-01, or None
+    Date-only end bounds are moved to the last second of that day.
+    """
+    if not value:
+        return None
+    try:
+        timestamp = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        logging.warning(f"Ignoring unparseable date filter: {value}")
+        return None
+    if end_of_day and timestamp == timestamp.normalize():
+        timestamp += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    return timestamp.value // 10**9
+
+def build_workorder_filters(params):
+    """Translate request filters into (where_clauses, query_params)"""
+    where_clauses = []
+    query_params = []
+    
+    # Handle date range filtering on the creation timestamp parsed at ingest
+    # (Order_date, falling back to Start_dt); end dates include the whole day
+    start_ts = date_filter_timestamp(params.pop('start_date', None))
+    end_ts = date_filter_timestamp(params.pop('end_date', None), end_of_day=True)
+    if start_ts is not None:
+        where_clauses.append("creation_ts >= ?")
+        query_params.append(start_ts)
+    if end_ts is not None:
+        where_clauses.append("creation_ts <= ?")
+        query_params.append(end_ts)
     
-    if "SNAG" in s:
-        if "FAULT #0" in s: return "loadCell"
-        if "FAULT #1" in s: return "Cylinder 1"
-        if "FAULT #2" in s: return "Cylinder 2" 
-        if "FAULT #3" in s: return "Cylinder 3"
-        if "FAULT #4" in s: return "Cylinder 4"
-        if any(x in s for x in ["FAULT #1 #2", "FAULT #1.#2"]): return "Cylinder 12"
-        if any(x in s for x in ["FAULT #1 #3", "FAULT #1.#3"]): return "Cylinder 13"
-        if any(x in s for x in ["FAULT #1 #4", "FAULT #1.#4"]): return "Cylinder 14"
-        if any(x in s for x in ["FAULT #2 #3", "FAULT #2.#3"]): return "Cylinder 23"
-        if any(x in s for x in ["FAULT #2 #4", "FAULT #2.#4"]): return "Cylinder 24"
-        if any(x in s for x in ["FAULT #3 #4", "FAULT #3.#4"]): return "Cylinder 34"
-        if any(x in s for x in ["FAULT #1 #2 #3", "FAULT #1.#2.#3"]): return "Cylinder 123"
-        if any(x in s for x in ["FAULT #1 #2 #4", "FAULT #1.#2.#4"]): return "Cylinder 124"
-        if any(x in s for x in ["FAULT #2 #3 #4", "FAULT #2.#3.#4"]): return "Cylinder 234"
-        if any(x in s for x in ["FAULT #1 #2 #3 #4", "FAULT #1.#2.#3.#4"]): return "Cylinder 1234"
+    # Handle other filters
+    for field, value in params.items():
+        if field in ['Equipement', 'Job_type', 'ETATJOB', 'status']:
+            if field == 'status':
+                # Match the stored status label, which get_status derived
+                # from ETATJOB ignoring case and surrounding blanks
+                if value in STATUS_CATEGORIES:
+                    where_clauses.append("status = ?")
+                    query_params.append(value)
+            else:
+                # Exact match for other fields
+                where_clauses.append(f"{field} = ?")
+                query_params.append(value)
     
-    return ""
+    return where_clauses, query_params
 
-def parse_excel_date(excel_date):
-    """Parse dates from various Excel formats"""
-    if not excel_date:
-        return None
-        
-    # If already a datetime object
-    if isinstance(excel_date, datetime):
-        return excel_date
-        
-    # If numeric (Excel serial date)
-    if isinstance(excel_date, (int, float)):
-        # Excel's epoch starts on 1/1/1900
-        excel_epoch = datetime(1899, 12, 30)  # Note: Excel incorrectly treats 1900 as leap year
-        return excel_epoch + timedelta(days=excel_date)
-        
-    # If string, try parsing various formats
-    if isinstance(excel_date, str):
-        formats = [
-            "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y",
-            "%Y/%m/%d", "%d-%m-%Y", "%Y-%d-%m"
-        ]
-        
-        for fmt in formats:
-            try:
-                return datetime.strptime(excel_date, fmt)
-            except ValueError:
-                continue
-                
-    return None
+def workorder_kpi_query(where):
+    """SQL aggregating status counts and durations over a WHERE clause"""
+    return (f"SELECT status, COUNT(*), SUM(duration_days), COUNT(duration_days) "
+            f"FROM Workorders{where} GROUP BY status")
 
-def get_month_from_date(date):
-    """Get YYYY-MM format from date"""
-    if not date:
-        return None
-    return date.strftime("%Y-%m")
-def get_quarter_from_date(date):
-    """Get YYYY-QN format from date"""
-    if not date:
-        return None
-    quarter = (date.month - 1) // 3 + 1
-    return f"{date.year}-Q{quarter}"
+def workorder_kpis(conn, where, query_params):
+    """
+    Aggregate dashboard KPIs in SQLite over the filtered work orders
+    One GROUP BY pass over the stored status; no rows are loaded into pandas.
+    """
+    counts = {status: 0 for status in STATUS_CATEGORIES}
+    total = 0
+    duration_sum = 0.0
+    duration_count = 0
+    rows = conn.execute(workorder_kpi_query(where), query_params)
+    for status, count, durations, with_duration in rows:
+        counts[status if status in counts else 'Pending'] += count
+        total += count
+        duration_sum += durations or 0.0
+        duration_count += with_duration
+
+    return {
+        'total_workorders': total,
+        'completed': counts['Completed'],
+        'in_progress': counts['Ready for Work'],
+        'pending': counts['Pending'],
+        'waiting_parts': counts['Wait for Spare Parts'],
+        'average_duration': duration_sum / duration_count if duration_count else None
+    }
+
+def cached_workorder_kpis(conn, where, query_params):
+    """
+    KPIs for a filter set, computed once per data version
+    The data version is part of the key, so any write makes older entries
+    unreachable and they are evicted as the LRU fills.
+    """
+    key = (get_data_version(conn), where, tuple(query_params))
+    kpis = _kpi_cache.get(key)
+    if kpis is None:
+        kpis = workorder_kpis(conn, where, query_params)
+        _kpi_cache.put(key, kpis)
+    return dict(kpis)
 
-def get_year_from_date(date):
-    """Get year as string from date"""
-    if not date:
+def encode_cursor(wo_key):
+    """Opaque keyset cursor for the page ending at wo_key"""
+    token = json.dumps({'WO_key': wo_key}).encode('utf-8')
+    return base64.urlsafe_b64encode(token).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Return the WO_key a cursor points after, or None for the first page
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    if not cursor:
         return None
-    return str(date.year)
+    try:
+        return str(json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))['WO_key'])
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
-def process_workorders(data):
+def json_column(values):
     """
-    Process workorder data to generate enriched information
+    Return a column in a form the JSON encoder can write directly
+    With orjson, numpy numeric columns stay numpy arrays (NaN is written as
+    null); otherwise, nullable Int64 included, values become Python objects
+    with None for missing.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        values = values.dt.strftime(STORAGE_DATE_FORMAT)
+    elif orjson is not None and pd.api.types.is_numeric_dtype(values) \
+            and not pd.api.types.is_bool_dtype(values) \
+            and not isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+        return values.to_numpy()
+    return values.astype(object).where(values.notna(), None).tolist()
+
+def frame_to_json(df, columnar=False):
+    """
+    Serialize DataFrame rows without an intermediate object-dtype frame
     Args:
-        data: DataFrame or list of dicts containing workorder data
+        df: DataFrame to serialize
+        columnar: column name -> array instead of a list of row objects
     Returns:
-        DataFrame with processed workorder data
+        JSON-ready list of records, or dict of columns
     """
-    if isinstance(data, list):
-        df = pd.DataFrame(data)
-    else:
-        df = data.copy()
-        
-    # Convert all numeric columns to native Python types
-    for col in df.select_dtypes(include=['int64', 'float64']).columns:
-        df[col] = df[col].astype(object).where(pd.notnull(df[col]), None)
-        
-    # Fill NA values
-    df = df.fillna('')
-    
-    # Combine description fields for classification
-    df['combined_desc'] = df['WO_name'] + ' ' + df['Description']
-    
-    # Parse dates with error handling
-    def safe_parse_date(date):
-        try:
-            return parse_excel_date(date)
-        except:
-            return None
-            
-    df['creation_date'] = df['Order_date'].combine_first(df['Start_dt']).apply(safe_parse_date)
-    df['execution_date'] = df['Jobexec_dt'].apply(safe_parse_date)
-    
-    # Calculate durations (skip invalid dates)
-    df['duration_days'] = df.apply(
-        lambda x: (x['execution_date'] - x['creation_date']).days 
-        if pd.notnull(x['execution_date']) and pd.notnull(x['creation_date']) 
-        else None,
-        axis=1
-    )
-    
-    # Determine equipment type
-    df['equipment_type'] = df['Equipement'].apply(
-        lambda x: 'STS' if str(x).upper().startswith('STS') 
-                 else 'Spreader' if str(x).upper().startswith('SP') 
-                 else 'Other'
-    )
-    
-    # Determine status
-    status_map = {
-        'exe': 'Ready for Work',
-        'apc': 'Wait for Spare Parts', 
-        'ter': 'Completed',
-        'ini': 'Initiated'
+    columns = {name: json_column(df[name]) for name in df.columns}
+    if columnar:
+        return columns
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+def dumps_json(payload):
+    """Encode a payload to JSON bytes, with numpy arrays and NaN as null"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=str).encode('utf-8')
+
+def json_response(payload):
+    """Return payload as an application/json response"""
+    return Response(dumps_json(payload), mimetype='application/json')
+
+def invalidate_response_cache():
+    """Bump the dataset version after a write; older responses age out"""
+    global _dataset_version
+    with _dataset_version_lock:
+        _dataset_version += 1
+
+def cached_response(view):
+    """
+    Serve a read endpoint from the response cache
+    Successful responses are cached by path, sorted query parameters, stored
+    data version, in-process dataset version and rules version, tagged with
+    a strong ETag of the body, and answered with 304 Not Modified when
+    If-None-Match matches. A hit costs one primary-key read of app_metadata,
+    so writes made by other processes are never served stale.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # The key is taken before the view runs, so a response computed
+        # across a write is stored under the version it may predate
+        with db_connection() as conn:
+            data_version = get_data_version(conn)
+        key = (request.path, tuple(sorted(request.args.items(multi=True))),
+               data_version, _dataset_version, rules_version())
+        entry = _response_cache.get(key)
+        if entry is None:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            entry = (body, f'"{hashlib.sha1(body).hexdigest()}"', response.mimetype)
+            _response_cache.put(key, entry)
+
+        body, etag, mimetype = entry
+        if request.if_none_match.contains(etag.strip('"')):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=mimetype)
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return wrapper
+
+def workorder_lists(conn, where, query_params):
+    """Distinct filter values over the filtered work orders"""
+    list_columns = {
+        'equipment': 'Equipement',
+        'categories': 'Job_type',
+        'fault_locations': 'ETATJOB',
+        'failure_causes': 'failure_cause',
+        'snag_locations': 'snag_location'
+    }
+    existing = table_columns(conn, 'Workorders')
+    return {
+        name: [row[0] for row in conn.execute(
+            f"SELECT DISTINCT {column} FROM Workorders{where}", query_params
+        )] if column in existing else []
+        for name, column in list_columns.items()
     }
-    
-    df['status'] = df['ETATJOB'].str.lower().map(status_map).fillna('Pending')
-    
-    # Calculate time periods (skip invalid dates)
-    df['month'] = df['creation_date'].apply(lambda x: get_month_from_date(x) if x else None)
-    df['quarter'] = df['creation_date'].apply(lambda x: get_quarter_from_date(x) if x else None)
-    df['year'] = df['creation_date'].apply(lambda x: get_year_from_date(x) if x else None)
-    
-    # Determine failure causes and snag locations
-    df['failure_cause'] = df['combined_desc'].apply(classify_failure)
-    df['snag_location'] = df['combined_desc'].apply(find_snag_location)
-    
-    # Add breakdown location (if available)
-    df['breakdown_location'] = df.get('Location', 'Unknown')
-    
-    return df
 
 @app.route('/all_data')
+@cached_response
 def get_all_data():
     """Endpoint to get all workorder data with filtering options"""
     try:
@@ -305,75 +1618,39 @@ def get_all_data():
     kpis_only = params.pop('kpis_only', 'false').lower() == 'true'
     list_fields = params.pop('list_fields', None)
     fields = params.pop('fields', None)
+    columnar = params.pop('format', 'records') == 'columnar'
     page = int(params.pop('page', 1))
     per_page = int(params.pop('per_page', 100))
+    # Keyset paging: present (even empty) selects WO_key-ordered cursor pages
+    after = params.pop('after', None)
+    try:
+        after_key = decode_cursor(after)
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid cursor',
+            'details': str(e),
+            'status': 'error'
+        }), 400
     
-    # Determine fields to select
-    select_fields = '*'
-    if fields:
-        field_list = [f.strip() for f in fields.split(',')]
-        valid_fields = ['WO_key', 'WO_name', 'Description', 'ETATJOB', 
-                      'Jobexec_dt', 'Order_date', 'Start_dt', 'Equipement',
-                      'Job_type', 'Cost_purpose_key']
-        select_fields = ', '.join([f for f in field_list if f in valid_fields])
+    # Use context manager to ensure connection is properly handled
+    with db_connection() as conn:
+        # Derived columns are materialized at upload; refresh them only if
+        # the enrichment rules changed since
+        ensure_enrichment_current(conn)
         
-        # Use context manager to ensure connection is properly handled
-        with sqlite3.connect(DATABASE) as conn:
-            # Base query with pagination
-            query = f"SELECT {select_fields} FROM Workorders"
-            
-            # Apply filters if any
-            where_clauses = []
-            query_params = []
-            
-            # Handle date range filtering
-            start_date = params.pop('start_date', None)
-            end_date = params.pop('end_date', None)
-            if start_date and end_date:
-                where_clauses.append("(Order_date >= ? OR Start_dt >= ?)")
-                query_params.extend([start_date, start_date])
-                where_clauses.append("(Order_date <= ? OR Start_dt <= ?)")
-                query_params.extend([end_date, end_date])
-            
-            # Handle other filters
-            for field, value in params.items():
-                if field in ['Equipement', 'Job_type', 'ETATJOB', 'status']:
-                    if field == 'status':
-                        # Map status names to ETATJOB codes
-                        status_map = {
-                            'Ready for Work': 'exe',
-                            'Wait for Spare Parts': 'apc',
-                            'Completed': 'ter',
-                            'Initiated': 'ini'
-                        }
-                        if value in status_map:
-                            where_clauses.append("ETATJOB = ?")
-                            query_params.append(status_map[value])
-                    else:
-                        # Exact match for other fields
-                        where_clauses.append(f"{field} = ?")
-                        query_params.append(value)
-            
-            if where_clauses:
-                query += " WHERE " + " AND ".join(where_clauses)
-            
-            # Add pagination
-            query += f" LIMIT {per_page} OFFSET {(page-1)*per_page}"
-            
-            # Execute with parameters to prevent SQL injection
-            # Explicitly cast numeric columns to TEXT to avoid numpy types
-            type_cast_query = query.replace("SELECT", "SELECT CAST(WO_key AS TEXT) as WO_key,") \
-                if select_fields == '*' else query
-            df = pd.read_sql_query(type_cast_query, conn, params=query_params)
-            
-            # Convert all remaining numeric columns to native Python types
-            for col in df.select_dtypes(include=['int64', 'float64']).columns:
-                df[col] = df[col].astype(object).where(pd.notnull(df[col]), None)
+        # Apply filters if any
+        where_clauses, query_params = build_workorder_filters(params)
+        where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+        
+        # KPIs and the total are aggregated in SQLite over the full filtered
+        # set, once per filter set until the data changes
+        kpis = cached_workorder_kpis(conn, where, query_params)
+        total = kpis['total_workorders']
         
         # Handle empty case
-        if df.empty:
+        if total == 0:
             return jsonify({
-                'raw_data': [],
+                'raw_data': {} if columnar else [],
                 'kpis': {},
                 'lists': {},
                 'pagination': {
@@ -383,108 +1660,83 @@ def get_all_data():
                 }
             })
         
-        # Process the workorder data
-        processed_df = process_workorders(df)
-        
-        # Get total count for pagination
-        with sqlite3.connect(DATABASE) as conn:
-            total_query = "SELECT COUNT(*) FROM Workorders"
-            if where_clauses:
-                total_query += " WHERE " + " AND ".join(where_clauses)
-            total = pd.read_sql_query(total_query, conn, params=query_params).iloc[0,0]
-        
         # Prepare response
+        pagination = {
+            'per_page': per_page,
+            'total': total,
+            'total_pages': (total + per_page - 1) // per_page
+        }
+        if after is None:
+            pagination['page'] = page
+        else:
+            pagination['after'] = after
+            pagination['next_cursor'] = None
         response = {
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'total_pages': (total + per_page - 1) // per_page
-            }
+            'pagination': pagination,
+            'kpis': kpis
         }
         
         # Add raw data unless only KPIs requested
         if not kpis_only:
-            # Convert DataFrame to dict with native Python types
-            response['raw_data'] = (
-                processed_df.apply(lambda x: x.astype(object) if x.dtype == 'int64' else x)
-                .astype(object)
-                .where(pd.notnull(processed_df), None)
-                .to_dict('records')
-            )
-        
-        # Calculate KPIs
-        response['kpis'] = {
-            'total_workorders': total,
-            'completed': len(processed_df[processed_df['status'] == 'Completed']),
-            'in_progress': len(processed_df[processed_df['status'] == 'Ready for Work']),
-            'pending': len(processed_df[processed_df['status'] == 'Pending']),
-            'waiting_parts': len(processed_df[processed_df['status'] == 'Wait for Spare Parts']),
-            'average_duration': float(processed_df['duration_days'].mean())
-        }
+            if after is None:
+                select_fields = workorder_select_fields(conn, fields)
+                query = f"SELECT {select_fields} FROM Workorders{where}"
+                query += f" LIMIT {per_page} OFFSET {(page-1)*per_page}"
+                page_params = query_params
+            else:
+                # Seek past the cursor on the WO_key primary key instead of
+                # scanning and discarding OFFSET rows
+                if fields and 'WO_key' not in [f.strip() for f in fields.split(',')]:
+                    fields += ',WO_key'
+                select_fields = workorder_select_fields(conn, fields)
+                page_clauses = list(where_clauses)
+                page_params = list(query_params)
+                if after_key is not None:
+                    page_clauses.append("Workorders.WO_key > ?")
+                    page_params.append(after_key)
+                page_where = " WHERE " + " AND ".join(page_clauses) if page_clauses else ""
+                query = (f"SELECT {select_fields} FROM Workorders{page_where} "
+                         f"ORDER BY Workorders.WO_key LIMIT {per_page}")
+            
+            # Execute with parameters to prevent SQL injection
+            df = pd.read_sql_query(query, conn, params=page_params)
+            # A page with a NULL would otherwise read INTEGER columns as
+            # floats and serialize 1705276800 as 1705276800.0
+            df = df.astype({column: 'Int64' for column, column_type in WORKORDER_COLUMN_TYPES.items()
+                            if column_type == 'INTEGER' and column in df.columns})
+            if after is not None and len(df) == per_page:
+                pagination['next_cursor'] = encode_cursor(df['WO_key'].iloc[-1])
+            
+            # Serialized straight from the columns; format=columnar sends
+            # column name -> array instead of one object per row
+            response['raw_data'] = frame_to_json(df, columnar=columnar)
         
         # Add field lists if requested
         if list_fields:
-            response['lists'] = {
-                'equipment': processed_df['Equipement'].unique().tolist(),
-                'categories': processed_df['Job_type'].unique().tolist(),
-                'fault_locations': processed_df['ETATJOB'].unique().tolist(),
-                'failure_causes': processed_df['failure_cause'].unique().tolist(),
-                'snag_locations': processed_df['snag_location'].unique().tolist()
-            }
-        
-        return jsonify(response)
+            response['lists'] = workorder_lists(conn, where, query_params)
+    
+    return json_response(response)
 
 @app.route('/stream_data')
 def stream_data():
     """Stream workorder data as newline-delimited JSON"""
     params = request.args.to_dict()
-    
-    # Determine fields to select
-    select_fields = '*'
-    if 'fields' in params:
-        field_list = [f.strip() for f in params['fields'].split(',')]
-        valid_fields = ['WO_key', 'WO_name', 'Description', 'ETATJOB', 
-                      'Jobexec_dt', 'Order_date', 'Start_dt', 'Equipement',
-                      'Job_type', 'Cost_purpose_key']
-        select_fields = ', '.join([f for f in field_list if f in valid_fields])
+    fields = params.pop('fields', None)
+    chunk_size = max(1, int(params.pop('chunk_size', STREAM_CHUNK_SIZE)))
     
     def generate():
+        started = time.perf_counter()
+        streamed = 0
         try:
-            with sqlite3.connect(DATABASE) as conn:
+            with db_connection() as conn:
+                ensure_enrichment_current(conn)
+                select_fields = workorder_select_fields(conn, fields)
+                
                 # Base query
                 query = f"SELECT {select_fields} FROM Workorders"
                 
                 # Apply filters if any
-                where_clauses = []
-                query_params = []
-                
-                # Handle date range filtering
-                start_date = params.pop('start_date', None)
-                end_date = params.pop('end_date', None)
-                if start_date and end_date:
-                    where_clauses.append("(Order_date >= ? OR Start_dt >= ?)")
-                    query_params.extend([start_date, start_date])
-                    where_clauses.append("(Order_date <= ? OR Start_dt <= ?)")
-                    query_params.extend([end_date, end_date])
-                
-                # Handle other filters
-                for field, value in params.items():
-                    if field in ['Equipement', 'Job_type', 'ETATJOB', 'status']:
-                        if field == 'status':
-                            status_map = {
-                                'Ready for Work': 'exe',
-                                'Wait for Spare Parts': 'apc',
-                                'Completed': 'ter',
-                                'Initiated': 'ini'
-                            }
-                            if value in status_map:
-                                where_clauses.append("ETATJOB = ?")
-                                query_params.append(status_map[value])
-                        else:
-                            where_clauses.append(f"{field} = ?")
-                            query_params.append(value)
-                
+                where_clauses, query_params = build_workorder_filters(params)
                 if where_clauses:
                     query += " WHERE " + " AND ".join(where_clauses)
                 
@@ -492,19 +1744,25 @@ def stream_data():
                 cursor = conn.cursor()
                 cursor.execute(query, query_params)
                 
-                # Stream results
+                # Stream results in chunks (enrichment columns are already
+                # materialized); memory is bounded by one chunk
                 columns = [col[0] for col in cursor.description]
-                for row in cursor:
-                    record = dict(zip(columns, row))
-                    processed = process_workorders(pd.DataFrame([record]))
-                    yield json.dumps(processed.to_dict('records')[0]) + '\n'
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield b''.join(dumps_json(dict(zip(columns, row))) + b'\n' for row in rows)
+                    streamed += len(rows)
+            elapsed = time.perf_counter() - started
+            logging.info(f"Streamed {streamed} workorders in {elapsed:.2f}s "
+                         f"({streamed / elapsed if elapsed else 0:.0f} rows/s)")
         except Exception as e:
-            logging.error(f"Error in stream_data generator: {str(e)}")
-            yield json.dumps({
+            logging.error(f"Error in stream_data generator after {streamed} rows: {str(e)}")
+            yield dumps_json({
                 'error': 'Failed to stream data',
                 'details': str(e),
                 'status': 'error'
-            }) + '\n'
+            }) + b'\n'
     
     try:
         return Response(generate(), mimetype='application/x-ndjson')
@@ -516,6 +1774,159 @@ def stream_data():
             'status': 'error'
         }), 500
 
+def rollup_kpis(counts):
+    """
+    Build the CM dashboard KPIs from row counts
+    Args:
+        counts: Counter of (status, month, Job_type) -> rows
+    Returns:
+        Dict with total, status counts and percentages, monthly_closed by
+        month and categories by Job_type
+    """
+    total = sum(counts.values())
+    by_status = Counter()
+    monthly_closed = Counter()
+    categories = Counter()
+    for (status, month, job_type), count in counts.items():
+        by_status[status] += count
+        if status == 'Completed':
+            monthly_closed[month or 'Unknown'] += count
+        categories[job_type or 'Other'] += count
+
+    def percent(count):
+        return round(count / total * 100, 1) if total else 0
+
+    closed = by_status['Completed']
+    waiting_parts = by_status['Wait for Spare Parts']
+    return {
+        'total': total,
+        'closed': closed,
+        'waiting_parts': waiting_parts,
+        'new': by_status['Initiated'],
+        'closed_percent': percent(closed),
+        'waiting_parts_percent': percent(waiting_parts),
+        'remaining_percent': percent(total - closed - waiting_parts),
+        'monthly_closed': dict(monthly_closed),
+        'categories': dict(categories)
+    }
+
+def sse_event(event, payload):
+    """Format one Server-Sent Event with a JSON payload"""
+    return b'event: ' + event.encode('ascii') + b'\ndata: ' + dumps_json(payload) + b'\n\n'
+
+@app.route('/stream_kpis')
+def stream_kpis():
+    """
+    Stream running CM KPI rollups as Server-Sent Events
+    Filtered rows are scanned in chunks; a 'progress' event with the partial
+    aggregates is sent every `every` rows and a 'done' event at the end, so
+    the payload does not grow with the row count.
+    """
+    params = request.args.to_dict()
+    chunk_size = max(1, int(params.pop('chunk_size', STREAM_CHUNK_SIZE)))
+    every = max(1, int(params.pop('every', KPI_EVENT_INTERVAL)))
+
+    def generate():
+        started = time.perf_counter()
+        counts = Counter()
+        scanned = 0
+        next_event = every
+        try:
+            with db_connection() as conn:
+                ensure_enrichment_current(conn)
+                where_clauses, query_params = build_workorder_filters(params)
+                where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+                cursor = conn.execute(
+                    f"SELECT status, month, Job_type FROM Workorders{where}", query_params
+                )
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    counts.update(rows)
+                    scanned += len(rows)
+                    if scanned >= next_event:
+                        yield sse_event('progress', {**rollup_kpis(counts), 'rows_scanned': scanned})
+                        next_event = scanned + every
+            yield sse_event('done', {**rollup_kpis(counts), 'rows_scanned': scanned})
+            logging.info(f"Aggregated {scanned} workorders for /stream_kpis in "
+                         f"{time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logging.error(f"Error in stream_kpis generator after {scanned} rows: {str(e)}")
+            yield sse_event('error', {
+                'error': 'Failed to aggregate KPIs',
+                'details': str(e),
+                'status': 'error'
+            })
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def build_cube_filters(params):
+    """
+    Translate /kpi_data filters into (where_clauses, query_params) on the cube
+    Dates select whole months; faultType matches a failure label exactly or
+    as a case-insensitive part of it (HOIST selects every hoist label).
+    """
+    where_clauses = []
+    query_params = []
+
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    if start_date:
+        where_clauses.append("month >= ?")
+        query_params.append(start_date[:7])
+    if end_date:
+        where_clauses.append("month <= ?")
+        query_params.append(end_date[:7])
+
+    fault_type = params.get('faultType')
+    if fault_type:
+        where_clauses.append("(failure_cause = ? OR failure_cause LIKE ?)")
+        query_params.extend([fault_type, f"%{fault_type}%"])
+
+    for field in ['status', 'month', 'equipment_type', 'Equipement', 'Job_type']:
+        if params.get(field):
+            where_clauses.append(f"{field} = ?")
+            query_params.append(params[field])
+
+    return where_clauses, query_params
+
+@app.route('/kpi_data')
+@cached_response
+def kpi_data():
+    """Breakdown dashboard KPIs summed from the rollup cube"""
+    try:
+        with db_connection() as conn:
+            ensure_enrichment_current(conn)
+            where_clauses, query_params = build_cube_filters(request.args.to_dict())
+            where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+            counts = Counter()
+            duration_sum = 0.0
+            duration_count = 0
+            for status, month, job_type, workorders, durations, with_duration in conn.execute(
+                f"SELECT status, month, Job_type, SUM(workorders), SUM(duration_sum), "
+                f"SUM(duration_count) FROM workorder_cube{where} "
+                f"GROUP BY status, month, Job_type",
+                query_params
+            ):
+                counts[(status, month, job_type)] += workorders
+                duration_sum += durations
+                duration_count += with_duration
+
+        kpis = rollup_kpis(counts)
+        kpis['average_duration'] = duration_sum / duration_count if duration_count else None
+        return jsonify(kpis)
+    except Exception as e:
+        logging.error(f"Error in /kpi_data endpoint: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Failed to fetch KPI data',
+            'details': str(e),
+            'status': 'error'
+        }), 500
+
 @app.route('/test')
 def test_endpoint():
     """Test endpoint to verify server is responding"""
@@ -588,16 +1999,26 @@ def upload_file():
             'code': 'INVALID_FILE_TYPE'
         }), 400
 
-    # Validate file size (max 10MB)
-    MAX_SIZE = 10 * 1024 * 1024  # 10MB
+    # Validate what happens to rows failing validation
+    invalid_rows = request.form.get('invalid_rows', request.args.get('invalid_rows', INVALID_ROWS))
+    if invalid_rows not in INVALID_ROW_MODES:
+        logging.warning(f"Invalid invalid_rows option: {invalid_rows}")
+        return jsonify({
+            'error': f'invalid_rows must be one of: {", ".join(INVALID_ROW_MODES)}',
+            'status': 'error',
+            'code': 'INVALID_OPTION'
+        }), 400
+
+    # Validate file size against the configured limit (MAX_UPLOAD_MB)
+    MAX_SIZE = MAX_UPLOAD_MB * 1024 * 1024
     file.seek(0, 2)  # Seek to end to get size
     file_size = file.tell()
     file.seek(0)  # Reset file pointer
     
-    if file_size > MAX_SIZE:
+    if MAX_SIZE and file_size > MAX_SIZE:
         logging.warning(f"File too large: {file.filename} ({file_size} bytes)")
         return jsonify({
-            'error': f'File too large - max size is {MAX_SIZE//(1024*1024)}MB',
+            'error': f'File too large - max size is {MAX_UPLOAD_MB}MB',
             'status': 'error',
             'code': 'FILE_TOO_LARGE'
         }), 400
@@ -606,23 +2027,20 @@ def upload_file():
     temp_dir = 'temp_uploads'
     os.makedirs(temp_dir, exist_ok=True)
     
+    queued = False
     try:
         # Save file temporarily for validation
-        temp_path = os.path.join(temp_dir, f"upload_{int(time.time())}_{file.filename}")
+        job_id = new_ingest_job_id()
+        temp_path = os.path.join(temp_dir, f"upload_{job_id}_{file.filename}")
         file.save(temp_path)
         logging.info(f"Saved upload to temp file: {temp_path}")
 
-        # Validate file contents
+        # Validate the header; rows are only read while ingesting
         try:
-            if temp_path.endswith(('.xlsx', '.xls')):
-                df = pd.read_excel(temp_path)
-            else:  # CSV
-                df = pd.read_csv(temp_path)
+            header = read_upload_header(temp_path, file.filename)
                 
             # Check for required columns
-            required_cols = ['WO_key', 'WO_name', 'Description', 'ETATJOB', 
-                           'Jobexec_dt', 'Order_date', 'Start_dt', 'Equipement']
-            missing_cols = [col for col in required_cols if col not in df.columns]
+            missing_cols = [col for col in REQUIRED_UPLOAD_COLUMNS if col not in header]
             
             if missing_cols:
                 logging.error(f"Missing required columns in {file.filename}: {missing_cols}")
@@ -641,57 +2059,18 @@ def upload_file():
                 'code': 'INVALID_FILE_CONTENTS'
             }), 400
 
-        # Update database
-        try:
-            conn = sqlite3.connect(DATABASE)
-            cursor = conn.cursor()
-            
-            # Backup current data
-            backup_table = f"Workorders_backup_{int(time.time())}"
-            cursor.execute(f"CREATE TABLE {backup_table} AS SELECT * FROM Workorders")
-            conn.commit()
-            logging.info(f"Created backup table: {backup_table}")
-
-            # Update with new data
-            df.to_sql('Workorders', conn, if_exists='replace', index=False)
-            
-            # Validate update
-            cursor.execute("SELECT COUNT(*) FROM Workorders")
-            new_count = cursor.fetchone()[0]
-            logging.info(f"Database updated - new record count: {new_count}")
-            
-            conn.close()
-            
-            # Clean up temp file
-            os.remove(temp_path)
-            
-            return jsonify({
-                'message': 'Database updated successfully',
-                'filename': file.filename,
-                'records_updated': new_count,
-                'backup_table': backup_table,
-                'status': 'success'
-            })
-            
-        except Exception as e:
-            logging.error(f"Database update failed for {file.filename}: {str(e)}", exc_info=True)
-            
-            # Attempt to restore from backup if exists
-            if 'backup_table' in locals():
-                try:
-                    cursor.execute("DROP TABLE IF EXISTS Workorders")
-                    cursor.execute(f"CREATE TABLE Workorders AS SELECT * FROM {backup_table}")
-                    conn.commit()
-                    logging.info("Restored database from backup")
-                except Exception as restore_error:
-                    logging.critical(f"Failed to restore database: {str(restore_error)}")
-            
-            return jsonify({
-                'error': 'Failed to update database',
-                'details': str(e),
-                'status': 'error',
-                'code': 'DATABASE_UPDATE_FAILED'
-            }), 500
+        # Ingest in the background; progress is polled from /jobs/<id>
+        replace = request.form.get('mode', request.args.get('mode', 'upsert')) == 'replace'
+        job = submit_ingest_job(job_id, temp_path, file.filename, replace, invalid_rows)
+        queued = True
+        logging.info(f"Queued upload job {job_id} for {file.filename}")
+        return jsonify({
+            'message': 'Upload accepted - processing in the background',
+            'job_id': job_id,
+            'job_url': f'/jobs/{job_id}',
+            'job': job,
+            'status': 'accepted'
+        }), 202
             
     except Exception as e:
         logging.error(f"Error processing upload: {str(e)}", exc_info=True)
@@ -703,25 +2082,56 @@ def upload_file():
         }), 500
         
     finally:
-        # Clean up temp file if it exists
-        if 'temp_path' in locals() and os.path.exists(temp_path):
+        # Clean up temp file if it exists and no job took it over
+        if not queued and 'temp_path' in locals() and os.path.exists(temp_path):
             try:
                 os.remove(temp_path)
             except Exception as e:
                 logging.warning(f"Failed to clean up temp file {temp_path}: {str(e)}")
 
+@app.route('/jobs')
+def ingest_jobs():
+    """List upload jobs, newest first"""
+    with _ingest_jobs_lock:
+        jobs = [ingest_job_status(job) for job in reversed(list(_ingest_jobs.values()))]
+    return jsonify({'jobs': jobs, 'queued': _ingest_queue.qsize()})
+
+@app.route('/jobs/<job_id>')
+def ingest_job(job_id):
+    """Stage, rows processed, throughput and outcome of an upload job"""
+    with _ingest_jobs_lock:
+        job = _ingest_jobs.get(job_id)
+        status = ingest_job_status(job) if job else None
+    if status is None:
+        return jsonify({
+            'error': 'Job not found',
+            'details': f'No upload job with id {job_id}',
+            'status': 'error',
+            'code': 'JOB_NOT_FOUND'
+        }), 404
+    return jsonify(status)
+
 @app.route('/table_lengths')
 def table_lengths():
+    """Row count per table from table_row_counts (exact=true recounts)"""
+    if request.args.get('exact', 'false').lower() == 'true':
+        # Recounts pick up writes made outside this server, so they bypass
+        # the response cache and invalidate it
+        response = table_lengths_response(exact=True)
+        invalidate_response_cache()
+        return response
+    return recorded_table_lengths()
+
+@cached_response
+def recorded_table_lengths():
+    """Serve recorded table lengths from the response cache"""
+    return table_lengths_response(exact=False)
+
+def table_lengths_response(exact):
+    """Render table lengths, recounting every table when exact"""
     try:
-        table_lengths = {}
-        conn = sqlite3.connect(DATABASE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = cursor.fetchall()
-        for table in tables:
-            cursor.execute(f"SELECT COUNT(*) FROM '{table[0]}'")
-            table_lengths[table[0]] = cursor.fetchone()[0]
-        conn.close()
+        with db_connection() as conn:
+            table_lengths = table_row_counts(conn, exact=exact)
         return jsonify(table_lengths)
     except Exception as e:
         logging.error(f"Error in /table_lengths endpoint: {str(e)}", exc_info=True)
@@ -731,6 +2141,148 @@ def table_lengths():
             'status': 'error'
         }), 500
 
+@app.route('/classification_cache')
+def classification_cache():
+    """Report hit/miss/eviction counters for the classification caches"""
+    return jsonify(classification_cache_stats())
+
+@app.route('/query_plan')
+def query_plan():
+    """
+    EXPLAIN QUERY PLAN and timing of the /all_data queries for a filter set
+    Takes the /all_data filter parameters plus per_page and the /stream_data
+    chunk_size; each query reports full_scan when SQLite walks the whole
+    Workorders table.
+    """
+    params = request.args.to_dict()
+    per_page = int(params.pop('per_page', 100))
+    chunk_size = max(1, int(params.pop('chunk_size', STREAM_CHUNK_SIZE)))
+    try:
+        with db_connection() as conn:
+            where_clauses, query_params = build_workorder_filters(params)
+            where = " WHERE " + " AND ".join(where_clauses) if where_clauses else ""
+            queries = {
+                'kpis': workorder_kpi_query(where),
+                'rows': f"SELECT {workorder_select_fields(conn)} FROM Workorders{where} "
+                        f"LIMIT {per_page}",
+                'stream': f"SELECT {workorder_select_fields(conn)} FROM Workorders{where}"
+            }
+            report = {}
+            for name, sql in queries.items():
+                plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", query_params)]
+                started = time.perf_counter()
+                # Count in chunks as /stream_data reads, so timing the
+                # unbounded stream query never holds its result in memory
+                cursor = conn.execute(sql, query_params)
+                rows = 0
+                while True:
+                    chunk = cursor.fetchmany(chunk_size)
+                    if not chunk:
+                        break
+                    rows += len(chunk)
+                report[name] = {
+                    'sql': sql,
+                    'params': query_params,
+                    'plan': plan,
+                    'full_scan': any(step.startswith('SCAN Workorders') for step in plan),
+                    'rows': rows,
+                    'elapsed_ms': (time.perf_counter() - started) * 1000
+                }
+        return jsonify(report)
+    except Exception as e:
+        logging.error(f"Error in /query_plan endpoint: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Failed to explain query',
+            'details': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/backups')
+def backups():
+    """List upload snapshots and the retention policy"""
+    return jsonify({
+        'snapshots': list_snapshots(),
+        'retention': {
+            'keep': BACKUP_KEEP,
+            'max_age_days': BACKUP_MAX_AGE_DAYS
+        }
+    })
+
+@app.route('/backups/<name>/restore', methods=['POST'])
+def restore_backup(name):
+    """Restore the database from an upload snapshot"""
+    try:
+        with db_connection() as conn:
+            previous = restore_snapshot(conn, name)
+        invalidate_response_cache()
+        logging.info(f"Restored snapshot {name}; previous contents saved as {previous}")
+        return jsonify({
+            'message': 'Snapshot restored',
+            'restored': name,
+            'previous': previous,
+            'status': 'success'
+        })
+    except FileNotFoundError as e:
+        return jsonify({
+            'error': 'Snapshot not found',
+            'details': str(e),
+            'status': 'error',
+            'code': 'SNAPSHOT_NOT_FOUND'
+        }), 404
+    except Exception as e:
+        logging.error(f"Error restoring snapshot {name}: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Failed to restore snapshot',
+            'details': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/connection_pool')
+def connection_pool():
+    """Report connection pool usage and wait statistics"""
+    return jsonify(_pool.stats())
+
+@app.route('/response_cache')
+def response_cache():
+    """Report hit/miss/eviction counters for the read response cache"""
+    return jsonify({
+        **_response_cache.stats(),
+        'dataset_version': _dataset_version,
+        'kpis': _kpi_cache.stats()
+    })
+
+@app.route('/reenrich', methods=['POST'])
+def reenrich():
+    """Recompute persisted enrichment (stale rows only unless all=true)"""
+    force = request.args.get('all', 'false').lower() == 'true'
+    workers = request.args.get('workers', type=int)
+    try:
+        with db_connection() as conn:
+            refreshed = refresh_enrichment(conn, force=force, workers=workers)
+        invalidate_response_cache()
+        return jsonify({
+            'message': 'Enrichment refreshed',
+            'rows_refreshed': refreshed,
+            'rules_version': rules_version(),
+            'status': 'success'
+        })
+    except Exception as e:
+        logging.error(f"Error in /reenrich endpoint: {str(e)}", exc_info=True)
+        return jsonify({
+            'error': 'Failed to refresh enrichment',
+            'details': str(e),
+            'status': 'error'
+        }), 500
+
+@app.route('/classification_cache/invalidate', methods=['POST'])
+def invalidate_classification():
+    """Drop memoized classifications, e.g. after the rule set changes"""
+    invalidate_classification_cache()
+    return jsonify({
+        'message': 'Classification cache invalidated',
+        'status': 'success'
+    })
+
 # Translation tools endpoints
 @app.route('/translate/excel', methods=['POST'])
 def translate_excel():
@@ -1040,18 +2592,15 @@ def ocr_pdf():
 def get_merged_purchases():
     """Get purchase data from database tables"""
     try:
-        conn = sqlite3.connect(DATABASE)
-        
-        # Get PO data
-        po_df = pd.read_sql_query("SELECT * FROM purchase_orders", conn)
-        
-        # Get PR data 
-        pr_df = pd.read_sql_query("SELECT * FROM purchase_requests", conn)
-        
-        # Get Sage data
-        sage_df = pd.read_sql_query("SELECT * FROM sage_transactions", conn)
-        
-        conn.close()
+        with db_connection() as conn:
+            # Get PO data
+            po_df = pd.read_sql_query("SELECT * FROM purchase_orders", conn)
+            
+            # Get PR data 
+            pr_df = pd.read_sql_query("SELECT * FROM purchase_requests", conn)
+            
+            # Get Sage data
+            sage_df = pd.read_sql_query("SELECT * FROM sage_transactions", conn)
 
         # Standardize column names for merging
         po_df = po_df.rename(columns={
@@ -1116,6 +2665,18 @@ def get_merged_purchases():
         print(f"Error merging purchase data: {str(e)}")
         return jsonify({'error': str(e)})
 
+if __name__ == '__main__' and sys.argv[1:2] == ['reenrich']:
+    # python server.py reenrich [--all] [--workers N]: refresh the persisted
+    # enrichment (stale rows only unless --all) and exit; N is capped at
+    # DASHBOARD_ENRICH_WORKERS, the size of the process pool
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        force=True)
+    workers = int(sys.argv[sys.argv.index('--workers') + 1]) if '--workers' in sys.argv else None
+    with db_connection() as conn:
+        refreshed = refresh_enrichment(conn, force='--all' in sys.argv, workers=workers)
+    print(f"Re-enriched {refreshed} workorders for rules version {rules_version()}")
+    sys.exit(0)
+
 if __name__ == '__main__':
     # Configure detailed logging
     import logging
@@ -1,100 +1,314 @@
 import pandas as pd
-from datetime import datetime
+import numpy as np
+import logging
+import hashlib
+import multiprocessing
+import os
+from datetime import datetime, timedelta
 import re
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Maximum number of distinct normalized descriptions kept per classification cache
+CLASSIFICATION_CACHE_SIZE = 50000
+
+class LRUCache:
+    """Thread-safe bounded mapping with LRU eviction and hit/miss counters"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+_MISSING = object()
+_failure_cache = LRUCache(CLASSIFICATION_CACHE_SIZE)
+_snag_cache = LRUCache(CLASSIFICATION_CACHE_SIZE)
+
+def classification_cache_stats():
+    """Return counters for the failure and snag classification caches"""
+    return {
+        'failure_cause': _failure_cache.stats(),
+        'snag_location': _snag_cache.stats()
+    }
+
+def invalidate_classification_cache():
+    """Drop all memoized classifications (call after changing the rule set)"""
+    _failure_cache.clear()
+    _snag_cache.clear()
+
+# Ordered failure rules: (label, keywords). The first rule with any keyword
+# present in the uppercased description wins, so order encodes priority
+# (e.g. "TELESC" must win over "TELESCOP").
+FAILURE_RULES = [
+    ("twin", ["TWIN"]),
+    ("Telescopy", ["TELESC"]),
+    ("Mech fail", ["NOISE", "DAMAGE", "BRUIT", "ENDOMMA", "VIBRE"]),
+    ("A/C", ["AC FAULT"]),
+    ("operator seat", ["SIÈGE", "SEAT"]),
+    ("Crane off", ["CRANE OF"]),
+    ("Drive Off", ["DRIVE OF", "CONTROL OF", "CONTROLE OF", "ALM"]),
+    ("Power cut off", ["POWER"]),
+    ("spreader ready intrlck", ["ROOF", "TTDS", "SPREADER READY"]),
+    ("Incident_Dommage", ["DOMMAGE"]),
+    ("Hoist service brake", ["HOIST BRAKE", "HOIST SERVICE BRAKE"]),
+    ("Hoist Emergency brake", ["HOIST EMERG"]),
+    ("Headblock", ["HDB", "HEADBLOCK"]),
+    ("Festoon", ["FESTOON"]),
+    ("Hoist slowdown", ["HOIST SLOW"]),
+    ("Display", ["AFFICHEUR"]),
+    ("Gantry drive", ["GANTRY DRIVE"]),
+    ("Gantry position", ["GANTRY POSITION"]),
+    ("Gantry wheel brake", ["GANTRY WHEEL"]),
+    ("Gantry brake", ["GANTRY BRAKE"]),
+    ("Gantry encoder", ["GANTRY ENCODER"]),
+    ("Gantry motor", ["GANTRY MOTOR"]),
+    ("Trolley drive", ["TROLLEY DRIVE"]),
+    ("Trolley position", ["TROLLEY POSITION"]),
+    ("Trolley brake", ["TROLLEY BRAKE"]),
+    ("Trolley gate", ["TROLLEY GATE"]),
+    ("Trolley rope tension", ["TROLLEY ROPE"]),
+    ("hoist drive", ["HOIST DRIVE"]),
+    ("hoist position", ["HOIST POSITION"]),
+    ("hoist wire rope", ["HOIST WIRE"]),
+    ("Hoist encoder", ["HOIST ENCODER"]),
+    ("Hoist motor", ["HOIST MOTOR"]),
+    ("GCR", ["GCR"]),
+    ("SCR", ["SCR", "SPREADER CABLE REEL"]),
+    ("Stuck", ["BAD STACK", "COINC", "SPREADER BLOQUÉ",
+               "SPREADER ACCROCHÉ", "STUCK"]),
+    ("Communication", ["BLINK FAULT", "COMMUNICA", "COMUNICA", "LIGHT BLINK"]),
+    ("Boom Drive", ["BOOM ISSUE", "BOOM FAULT", "BOOM INV"]),
+    ("Boom position", ["BOOM LEVEL", "BOOM DOWN", "BOOM UP", "NO BOOM"]),
+    ("TLS fault", ["TLS"]),
+    ("spreader change", ["CHANGE", "CHANGEMENT"]),
+    ("Joystick fault", ["JOYSTICK", "JOYSTI"]),
+    ("spreader plug", ["CONNECTOR", "PLUG"]),
+    ("oil leakage", ["FUITE D'HUILE", "OIL LEAK"]),
+    ("Lock/unlock", ["DÉVÉRROU", "VÉRROU", "LOCK FAULT", "UNLOCK",
+                     "UNLOPK", "LOCKING FAULT"]),
+    ("Flipper", ["FLIPPER"]),
+    ("Telescopic", ["TELESCOP", "TELECO", "TELSCO"]),
+    ("Light", ["LIGHTS", "LIGHT", "LIGHT FAULT", "LIGHT ISSUE",
+               "LIGHT OFF", "LAMPE", "FLOODLIGHT"]),
+    ("spreader pump", ["POMPE SPREADER", "SPREADER PUMP", "PUMP"]),
+]
+
+def compile_failure_rules(rules):
+    """
+    Compile ordered failure rules into a single-pass matcher
+    Args:
+        rules: list of (label, keywords) tuples in priority order
+    Returns:
+        (pattern, ranks) where pattern finds every keyword occurrence
+        (overlapping) and ranks maps each keyword to its rule index
+    """
+    ranks = {}
+    for rank, (_, keywords) in enumerate(rules):
+        for keyword in keywords:
+            ranks.setdefault(keyword, rank)
+
+    # Keywords are grouped by first character so each position only tries the
+    # branches that can start there; within a group they are tried in priority
+    # order. The zero-width lookahead reports overlapping keywords too, so the
+    # lowest rank seen over one scan is the first rule that would match.
+    groups = {}
+    for keyword in sorted(ranks, key=lambda k: (ranks[k], -len(k))):
+        groups.setdefault(keyword[0], []).append(keyword)
+    branches = [
+        re.escape(first) + '(?:' + '|'.join(re.escape(k[1:]) for k in keywords) + ')'
+        for first, keywords in groups.items()
+    ]
+    pattern = re.compile('(?=(' + '|'.join(branches) + '))')
+    return pattern, ranks
+
+# (rules, pattern, ranks) swapped as one tuple so readers never mix rule sets
+_failure_engine = (FAILURE_RULES,) + compile_failure_rules(FAILURE_RULES)
+
+_rules_version = None
+
+def set_failure_rules(rules):
+    """Replace the active failure rules and invalidate memoized results"""
+    global _failure_engine, _rules_version
+    _failure_engine = (rules,) + compile_failure_rules(rules)
+    _rules_version = None
+    invalidate_classification_cache()
+
+def failure_rule_labels():
+    """Return the labels of the active failure rules, in rule order"""
+    return [label for label, _ in _failure_engine[0]]
+
+def match_failure_rule(text):
+    """Return the label of the first failure rule found in normalized text, or None"""
+    rules, pattern, ranks = _failure_engine
+    best = None
+    for match in pattern.finditer(text):
+        rank = ranks[match.group(1)]
+        if best is None or rank < best:
+            best = rank
+            if rank == 0:
+                break
+    return None if best is None else rules[best][0]
 
 def classify_failure(cause):
     """Classify failure type based on description text"""
     if not cause:
         return cause
-        
-    d = str(cause).strip().upper()
-    
-    if "TWIN" in d: return "twin"
-    if "TELESC" in d: return "Telescopy"
-    if any(x in d for x in ["NOISE", "DAMAGE", "BRUIT", "ENDOMMA", "VIBRE"]): 
-        return "Mech fail"
-    if "AC FAULT" in d: return "A/C"
-    if any(x in d for x in ["SIÈGE", "SEAT"]): return "operator seat"
-    if "CRANE OF" in d: return "Crane off"
-    if any(x in d for x in ["DRIVE OF", "CONTROL OF", "CONTROLE OF", "ALM"]): 
-        return "Drive Off"
-    if "POWER" in d: return "Power cut off"
-    if any(x in d for x in ["ROOF", "TTDS", "SPREADER READY"]): 
-        return "spreader ready intrlck"
-    if "DOMMAGE" in d: return "Incident_Dommage"
-    if any(x in d for x in ["HOIST BRAKE", "HOIST SERVICE BRAKE"]): 
-        return "Hoist service brake"
-    if "HOIST EMERG" in d: return "Hoist Emergency brake"
-    if any(x in d for x in ["HDB", "HEADBLOCK"]): return "Headblock"
-    if "FESTOON" in d: return "Festoon"
-    if "HOIST SLOW" in d: return "Hoist slowdown"
-    if "AFFICHEUR" in d: return "Display"
-    if "GANTRY DRIVE" in d: return "Gantry drive"
-    if "GANTRY POSITION" in d: return "Gantry position"
-    if "GANTRY WHEEL" in d: return "Gantry wheel brake"
-    if "GANTRY BRAKE" in d: return "Gantry brake"
-    if "GANTRY ENCODER" in d: return "Gantry encoder"
-    if "GANTRY MOTOR" in d: return "Gantry motor"
-    if "TROLLEY DRIVE" in d: return "Trolley drive"
-    if "TROLLEY POSITION" in d: return "Trolley position"
-    if "TROLLEY BRAKE" in d: return "Trolley brake"
-    if "TROLLEY GATE" in d: return "Trolley gate"
-    if "TROLLEY ROPE" in d: return "Trolley rope tension"
-    if "HOIST DRIVE" in d: return "hoist drive"
-    if "HOIST POSITION" in d: return "hoist position"
-    if "HOIST WIRE" in d: return "hoist wire rope"
-    if "HOIST ENCODER" in d: return "Hoist encoder"
-    if "HOIST MOTOR" in d: return "Hoist motor"
-    if "GCR" in d: return "GCR"
-    if any(x in d for x in ["SCR", "SPREADER CABLE REEL"]): return "SCR"
-    if any(x in d for x in ["BAD STACK", "COINC", "SPREADER BLOQUÉ", 
-                           "SPREADER ACCROCHÉ", "STUCK"]): return "Stuck"
-    if any(x in d for x in ["BLINK FAULT", "COMMUNICA", "COMUNICA", "LIGHT BLINK"]): 
-        return "Communication"
-    if any(x in d for x in ["BOOM ISSUE", "BOOM FAULT", "BOOM INV"]): return "Boom Drive"
-    if any(x in d for x in ["BOOM LEVEL", "BOOM DOWN", "BOOM UP", "NO BOOM"]): 
-        return "Boom position"
-    if "TLS" in d: return "TLS fault"
-    if any(x in d for x in ["CHANGE", "CHANGEMENT"]): return "spreader change"
-    if any(x in d for x in ["JOYSTICK", "JOYSTI"]): return "Joystick fault"
-    if any(x in d for x in ["CONNECTOR", "PLUG"]): return "spreader plug"
-    if any(x in d for x in ["FUITE D'HUILE", "OIL LEAK"]): return "oil leakage"
-    if any(x in d for x in ["DÉVÉRROU", "VÉRROU", "LOCK FAULT", "UNLOCK", 
-                           "UNLOPK", "LOCKING FAULT"]): return "Lock/unlock"
-    if "FLIPPER" in d: return "Flipper"
-    if any(x in d for x in ["TELESCOP", "TELECO", "TELSCO"]): return "Telescopic"
-    if any(x in d for x in ["LIGHTS", "LIGHT", "LIGHT FAULT", "LIGHT ISSUE", 
-                           "LIGHT OFF", "LAMPE", "FLOODLIGHT"]): return "Light"
-    if any(x in d for x in ["POMPE SPREADER", "SPREADER PUMP", "PUMP"]): 
-        return "spreader pump"
-    
-    return cause
+
+    key = str(cause).strip().upper()
+    label = _failure_cache.get(key, _MISSING)
+    if label is _MISSING:
+        label = match_failure_rule(key)
+        _failure_cache.put(key, label)
+    return cause if label is None else label
+
+def classify_failures(descriptions):
+    """
+    Vectorized classify_failure over a whole Series
+    Each distinct description is classified once and broadcast back.
+    Args:
+        descriptions: pandas Series (or array-like) of description text
+    Returns:
+        Series of failure labels aligned with the input
+    """
+    values = pd.Series(descriptions)
+    codes, uniques = pd.factorize(values)
+    labels = np.array([classify_failure(u) for u in uniques] + [None], dtype=object)
+
+    result = labels[codes]
+    missing = codes == -1
+    if missing.any():
+        result[missing] = values.to_numpy(dtype=object)[missing]
+    return pd.Series(result, index=values.index, name=values.name)
+
+# "FAULT #" followed by one or more cylinder numbers, e.g. "FAULT #1",
+# "FAULT #1 #2" or "FAULT #1.#2.#3"; #0 is the load cell
+_SNAG_PATTERN = re.compile(r'FAULT #([0-4](?:[ .]+#[0-4])*)')
+
+# Snag location labels. A cylinder combination outside this list falls back
+# to its lowest cylinder, as the original per-cylinder checks did.
+SNAG_LOCATIONS = [
+    "loadCell", "Cylinder 1", "Cylinder 2", "Cylinder 3", "Cylinder 4",
+    "Cylinder 12", "Cylinder 13", "Cylinder 14", "Cylinder 23", "Cylinder 24",
+    "Cylinder 34", "Cylinder 123", "Cylinder 124", "Cylinder 234", "Cylinder 1234"
+]
+
+def snag_label(groups):
+    """Map every matched cylinder group of a text (e.g. ["2", "1 #3"]) to one label"""
+    digits = sorted(set(re.findall('[0-4]', ' '.join(groups))))
+    # The load cell wins wherever it is mentioned
+    if '0' in digits:
+        return "loadCell"
+    label = "Cylinder " + ''.join(digits)
+    return label if label in SNAG_LOCATIONS else "Cylinder " + digits[0]
+
+def match_snag_location(s):
+    """Return the snag location for normalized (uppercased) text"""
+    if "SNAG" not in s:
+        return ""
+    groups = _SNAG_PATTERN.findall(s)
+    return snag_label(groups) if groups else ""
 
 def find_snag_location(short):
     """Determine snag location based on description text"""
     if not short:
         return ""
-        
-    s = str(short).upper()
-    
-    if "SNAG" in s:
-        if "FAULT #0" in s: return "loadCell"
-        if "FAULT #1" in s: return "Cylinder 1"
-        if "FAULT #2" in s: return "Cylinder 2" 
-        if "FAULT #3" in s: return "Cylinder 3"
-        if "FAULT #4" in s: return "Cylinder 4"
-        if any(x in s for x in ["FAULT #1 #2", "FAULT #1.#2"]): return "Cylinder 12"
-        if any(x in s for x in ["FAULT #1 #3", "FAULT #1.#3"]): return "Cylinder 13"
-        if any(x in s for x in ["FAULT #1 #4", "FAULT #1.#4"]): return "Cylinder 14"
-        if any(x in s for x in ["FAULT #2 #3", "FAULT #2.#3"]): return "Cylinder 23"
-        if any(x in s for x in ["FAULT #2 #4", "FAULT #2.#4"]): return "Cylinder 24"
-        if any(x in s for x in ["FAULT #3 #4", "FAULT #3.#4"]): return "Cylinder 34"
-        if any(x in s for x in ["FAULT #1 #2 #3", "FAULT #1.#2.#3"]): return "Cylinder 123"
-        if any(x in s for x in ["FAULT #1 #2 #4", "FAULT #1.#2.#4"]): return "Cylinder 124"
-        if any(x in s for x in ["FAULT #2 #3 #4", "FAULT #2.#3.#4"]): return "Cylinder 234"
-        if any(x in s for x in ["FAULT #1 #2 #3 #4", "FAULT #1.#2.#3.#4"]): return "Cylinder 1234"
-    
-    return ""
+
+    key = str(short).strip().upper()
+    location = _snag_cache.get(key, _MISSING)
+    if location is _MISSING:
+        location = match_snag_location(key)
+        _snag_cache.put(key, location)
+    return location
+
+def find_snag_locations(descriptions):
+    """
+    find_snag_location over a whole Series
+    Each distinct description is looked up once in the snag cache; the
+    misses are matched together with str.extractall, labelled and cached,
+    and the labels are broadcast back.
+    Args:
+        descriptions: pandas Series (or array-like) of description text
+    Returns:
+        Series of snag location labels ("" when none) aligned with the input
+    """
+    values = pd.Series(descriptions)
+    codes, uniques = pd.factorize(values)
+    keys = pd.Series(uniques, dtype=object).astype(str).str.strip().str.upper()
+    labels = np.array([_snag_cache.get(key, _MISSING) for key in keys] + [''], dtype=object)
+
+    missing = np.flatnonzero([label is _MISSING for label in labels])
+    if len(missing):
+        misses = keys.iloc[missing]
+        found = pd.Series('', index=misses.index, dtype=object)
+        snags = misses[misses.str.contains('SNAG', regex=False)]
+        groups = snags.str.extractall(_SNAG_PATTERN)[0] if len(snags) else pd.Series(dtype=object)
+        if len(groups):
+            # Every match of a description counts, as in match_snag_location
+            joined = groups.groupby(level=0).agg(' '.join)
+            found[joined.index] = [snag_label([group]) for group in joined]
+        for key, location in zip(misses, found):
+            _snag_cache.put(key, location)
+        labels[missing] = found.to_numpy()
+    return pd.Series(labels[codes], index=values.index, name=values.name)
+
+# String date formats tried by parse_excel_date, in order of preference
+DATE_FORMATS = [
+    "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y",
+    "%Y/%m/%d", "%d-%m-%Y", "%Y-%d-%m",
+    "%Y-%m-%d %H:%M:%S"
+]
+
+# Excel's epoch starts on 1/1/1900
+EXCEL_EPOCH = datetime(1899, 12, 30)  # Note: Excel incorrectly treats 1900 as leap year
+
+# Number of string values sampled per column to infer its dominant format
+DATE_SAMPLE_SIZE = 1000
+
+# Excel serials outside this range cannot be represented as datetime64[ns]
+_MIN_SERIAL = (pd.Timestamp.min - EXCEL_EPOCH).days + 1
+_MAX_SERIAL = (pd.Timestamp.max - EXCEL_EPOCH).days - 1
+
+# Date text that is an Excel serial, as read from a CSV column kept as text
+_SERIAL_PATTERN = re.compile(r'\s*\d+(?:\.\d*)?\s*')
 
 def parse_excel_date(excel_date):
     """Parse dates from various Excel formats"""
@@ -107,18 +321,11 @@ def parse_excel_date(excel_date):
         
     # If numeric (Excel serial date)
     if isinstance(excel_date, (int, float)):
-        # Excel's epoch starts on 1/1/1900
-        excel_epoch = datetime(1899, 12, 30)  # Note: Excel incorrectly treats 1900 as leap year
-        return excel_epoch + timedelta(days=excel_date)
+        return EXCEL_EPOCH + timedelta(days=excel_date)
         
     # If string, try parsing various formats
     if isinstance(excel_date, str):
-        formats = [
-            "%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y",
-            "%Y/%m/%d", "%d-%m-%Y", "%Y-%d-%m"
-        ]
-        
-        for fmt in formats:
+        for fmt in DATE_FORMATS:
             try:
                 return datetime.strptime(excel_date, fmt)
             except ValueError:
@@ -126,79 +333,549 @@ def parse_excel_date(excel_date):
                 
     return None
 
+def infer_date_format(strings, sample_size=DATE_SAMPLE_SIZE):
+    """
+    Infer the dominant DATE_FORMATS entry for a set of date strings
+    Args:
+        strings: numpy array of non-empty date strings
+        sample_size: number of values to test each format against
+    Returns:
+        The format parsing the most sampled values (earlier formats win
+        ties), or None if no format parses any of them
+    """
+    if len(strings) > sample_size:
+        rng = np.random.default_rng(0)
+        strings = strings[rng.choice(len(strings), sample_size, replace=False)]
+
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = int(pd.to_datetime(strings, format=fmt, errors='coerce').notna().sum())
+        if count > best_count:
+            best, best_count = fmt, count
+    return best
+
+def _date_value_kinds(values):
+    """
+    Return (is_string, is_numeric, is_datetime) masks for a date column
+    Numeric strings count as numeric: a CSV date column is read as text, so
+    its Excel serials arrive as '45123' rather than 45123.
+    """
+    present = values.notna().to_numpy()
+    absent = np.zeros(len(values), dtype=bool)
+    kind = pd.api.types.infer_dtype(values, skipna=True)
+    if kind in ('string', 'empty'):
+        is_str, is_num, is_dt = present, absent, absent
+    elif kind in ('floating', 'integer', 'mixed-integer-float', 'decimal'):
+        return absent, present, absent
+    elif kind in ('datetime', 'datetime64', 'date'):
+        return absent, absent, present
+    else:
+        # Mixed column (e.g. Excel serials next to typed-in dates): split by type
+        raw = values.to_numpy(dtype=object)
+        is_str = np.fromiter((isinstance(v, str) for v in raw), dtype=bool, count=len(raw))
+        is_dt = np.fromiter((isinstance(v, datetime) for v in raw), dtype=bool, count=len(raw))
+        is_num = np.fromiter((isinstance(v, (int, float)) for v in raw), dtype=bool, count=len(raw))
+        is_num = is_num & present
+
+    if is_str.any():
+        # Match each distinct string once
+        codes, uniques = pd.factorize(values.to_numpy(dtype=object)[is_str])
+        serial = np.array([bool(_SERIAL_PATTERN.fullmatch(value)) for value in uniques], dtype=bool)
+        if serial.any():
+            is_serial = np.zeros(len(values), dtype=bool)
+            is_serial[is_str] = serial[codes]
+            is_str, is_num = is_str & ~is_serial, is_num | is_serial
+    return is_str, is_num, is_dt
+
+def parse_date_column(values, sample_size=DATE_SAMPLE_SIZE, date_format=None):
+    """
+    Vectorized parse_excel_date over a whole column
+    String values are parsed with the column's dominant format, then with
+    the remaining DATE_FORMATS, and only the leftovers go through
+    parse_excel_date one by one. Excel serials, numeric or numeric text,
+    are converted with a single offset from EXCEL_EPOCH.
+    Args:
+        values: pandas Series of raw date values (strings, serials, datetimes)
+        sample_size: number of strings sampled to infer the dominant format
+        date_format: dominant format to use instead of inferring it from
+            these values; pass it when parsing a column in parts so that
+            ambiguous dates (05/01/2024) read the same in every part
+    Returns:
+        (dates, report) where dates is a datetime64 Series (NaT when missing
+        or unparseable) and report counts the rows handled by each stage
+    """
+    values = pd.Series(values)
+    report = {
+        'rows': len(values),
+        'format': None,
+        'datetime': 0,
+        'serial': 0,
+        'dominant_format': 0,
+        'other_formats': 0,
+        'per_value': 0,
+        'unparsed': 0
+    }
+
+    if pd.api.types.is_datetime64_any_dtype(values):
+        report['datetime'] = int(values.notna().sum())
+        return values, report
+
+    raw = values.to_numpy(dtype=object)
+    out = np.full(len(raw), np.datetime64('NaT'), dtype='datetime64[ns]')
+    is_str, is_num, is_dt = _date_value_kinds(values)
+
+    if is_dt.any():
+        parsed = pd.to_datetime(raw[is_dt], errors='coerce')
+        out[is_dt] = parsed.to_numpy(dtype='datetime64[ns]')
+        report['datetime'] = int(parsed.notna().sum())
+
+    if is_num.any():
+        serials = pd.to_numeric(raw[is_num], errors='coerce').astype(float)
+        # Zero is falsy and treated as missing, as in parse_excel_date
+        valid = (serials != 0) & (serials > _MIN_SERIAL) & (serials < _MAX_SERIAL)
+        positions = np.flatnonzero(is_num)[valid]
+        offsets = pd.to_timedelta(serials[valid], unit='D')
+        out[positions] = (pd.Timestamp(EXCEL_EPOCH) + offsets).to_numpy(dtype='datetime64[ns]')
+        report['serial'] = int(valid.sum())
+        report['unparsed'] += int((~valid & (serials != 0)).sum())
+
+    if is_str.any():
+        positions = np.flatnonzero(is_str)
+        strings = raw[positions]
+        nonempty = strings != ''
+        positions, strings = positions[nonempty], strings[nonempty]
+
+        dominant = date_format or (infer_date_format(strings, sample_size) if len(strings) else None)
+        report['format'] = dominant
+        ordered = [dominant] + [f for f in DATE_FORMATS if f != dominant] if dominant else []
+        for fmt in ordered:
+            if not len(strings):
+                break
+            parsed = pd.to_datetime(strings, format=fmt, errors='coerce')
+            ok = parsed.notna()
+            out[positions[ok]] = parsed[ok].to_numpy(dtype='datetime64[ns]')
+            report['dominant_format' if fmt == dominant else 'other_formats'] += int(ok.sum())
+            positions, strings = positions[~ok], strings[~ok]
+
+        # Leftovers go through parse_excel_date, each distinct string once
+        if len(strings):
+            codes, uniques = pd.factorize(strings)
+            fallback = np.array([parse_excel_date(value) or np.datetime64('NaT') for value in uniques],
+                                dtype='datetime64[ns]')[codes]
+            ok = ~np.isnat(fallback)
+            out[positions[ok]] = fallback[ok]
+            report['per_value'] += int(ok.sum())
+            report['unparsed'] += int((~ok).sum())
+
+    return pd.Series(out, index=values.index, name=values.name), report
+
 def get_month_from_date(date):
     """Get YYYY-MM format from date"""
-    if not date:
+    if pd.isnull(date):
         return None
     return date.strftime("%Y-%m")
 
 def get_quarter_from_date(date):
     """Get YYYY-QN format from date"""
-    if not date:
+    if pd.isnull(date):
         return None
     quarter = (date.month - 1) // 3 + 1
     return f"{date.year}-Q{quarter}"
 
 def get_year_from_date(date):
     """Get year as string from date"""
-    if not date:
+    if pd.isnull(date):
         return None
     return str(date.year)
 
-def process_workorders(data):
+# Raw date columns of a work order
+DATE_COLUMNS = ['Order_date', 'Start_dt', 'Jobexec_dt']
+
+def infer_date_formats(df, known=None, sample_size=DATE_SAMPLE_SIZE):
+    """
+    Return {column: dominant format} for the raw date columns of df
+    Columns in known keep their format; the others are inferred from their
+    string values and left out when they have none.
+    """
+    formats = dict(known or {})
+    for column in DATE_COLUMNS:
+        if column in formats or column not in df:
+            continue
+        is_str, _, _ = _date_value_kinds(df[column])
+        strings = df[column].to_numpy(dtype=object)[is_str]
+        strings = strings[strings != '']
+        date_format = infer_date_format(strings, sample_size) if len(strings) else None
+        if date_format:
+            formats[column] = date_format
+    return formats
+
+def parse_workorder_dates(df, date_formats=None, parsed_dates=None):
+    """
+    Add creation_date and execution_date columns parsed column-wise
+    creation_date is Order_date, falling back to Start_dt where Order_date
+    is missing or unparseable.
+    Args:
+        df: DataFrame of raw workorder columns, updated in place
+        date_formats: {column: format} from infer_date_formats; columns
+            without one infer their format from df
+        parsed_dates: {column: datetime Series} already parsed (e.g. by
+            validate_workorders), aligned on df's index; these columns are
+            not parsed again and get no report
+    Returns:
+        Dict of parse reports keyed by source column
+    """
+    date_formats = date_formats or {}
+    parsed_dates = parsed_dates or {}
+    reports = {}
+    parsed = {}
+    for column in DATE_COLUMNS:
+        if column in parsed_dates:
+            parsed[column] = parsed_dates[column].reindex(df.index)
+        elif column in df:
+            parsed[column], reports[column] = parse_date_column(
+                df[column], date_format=date_formats.get(column))
+        else:
+            parsed[column] = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+
+    df['creation_date'] = parsed['Order_date'].fillna(parsed['Start_dt'])
+    df['execution_date'] = parsed['Jobexec_dt']
+    logging.debug(f"Date parsing report: {reports}")
+    return reports
+
+# ETATJOB code -> status label; unknown codes are 'Pending'
+STATUS_MAP = {
+    'exe': 'Ready for Work',
+    'apc': 'Wait for Spare Parts',
+    'ter': 'Completed',
+    'ini': 'Initiated'
+}
+STATUS_CATEGORIES = list(STATUS_MAP.values()) + ['Pending']
+EQUIPMENT_TYPES = ['STS', 'Spreader', 'Other']
+
+def _text_column(df, column):
+    """Return a column as strings, with missing values (or a missing column) as ''"""
+    if column not in df:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[column].fillna('').astype(str)
+
+def _period_labels(dates, freq, fmt):
+    """Format datetimes as period labels, formatting each distinct period once"""
+    periods = pd.Categorical(dates.dt.to_period(freq))
+    return periods.rename_categories(periods.categories.strftime(fmt))
+
+def _categorical_from_distinct(values, label, categories, missing):
+    """
+    Build a categorical by labelling each distinct value once
+    Args:
+        values: Series to label
+        label: function mapping one distinct value to a category
+        categories: list of allowed categories
+        missing: category used for missing values
+    """
+    codes, uniques = pd.factorize(values)
+    lookup = [categories.index(label(u)) for u in uniques] + [categories.index(missing)]
+    return pd.Categorical.from_codes(np.array(lookup)[codes], categories=categories)
+
+def get_equipment_type(equipment):
+    """Get STS/Spreader/Other from an equipment code"""
+    code = str(equipment).upper()
+    if code.startswith('STS'):
+        return 'STS'
+    if code.startswith('SP'):
+        return 'Spreader'
+    return 'Other'
+
+def get_status(etatjob):
+    """Get status label from an ETATJOB code, ignoring case and surrounding blanks"""
+    return STATUS_MAP.get(str(etatjob).strip().lower(), 'Pending')
+
+def process_workorders(data, date_formats=None, parsed_dates=None):
     """
     Process workorder data to generate enriched information
+    Low-cardinality outputs (status, equipment_type, failure_cause,
+    snag_location, month, quarter, year) are stored as categoricals.
     Args:
         data: DataFrame or list of dicts containing workorder data
+        date_formats: {column: format} for the date columns (see
+            parse_workorder_dates)
+        parsed_dates: date columns already parsed (see parse_workorder_dates)
     Returns:
         DataFrame with processed workorder data
     """
     if isinstance(data, list):
         df = pd.DataFrame(data)
     else:
-        df = data.copy()
-        
-    # Fill NA values
-    df = df.fillna('')
-    
+        # Shallow copy: derived columns are added without copying the input data
+        df = data.copy(deep=False)
+
     # Combine description fields for classification
-    df['combined_desc'] = df['WO_name'] + ' ' + df['Description']
-    
-    # Parse dates
-    df['creation_date'] = df['Order_date'].combine_first(df['Start_dt']).apply(parse_excel_date)
-    df['execution_date'] = df['Jobexec_dt'].apply(parse_excel_date)
-    
-    # Determine equipment type
-    df['equipment_type'] = df['Equipement'].apply(
-        lambda x: 'STS' if str(x).upper().startswith('STS') 
-                 else 'Spreader' if str(x).upper().startswith('SP') 
-                 else 'Other'
+    df['combined_desc'] = _text_column(df, 'WO_name') + ' ' + _text_column(df, 'Description')
+
+    # Parse dates column-wise (unparseable values become NaT)
+    df.attrs['date_parsing'] = parse_workorder_dates(df, date_formats, parsed_dates)
+
+    # Calculate durations (NaN when either date is missing)
+    df['duration_days'] = (df['execution_date'] - df['creation_date']).dt.days
+
+    # Determine equipment type and status, labelling each distinct code once
+    df['equipment_type'] = _categorical_from_distinct(
+        df['Equipement'], get_equipment_type, EQUIPMENT_TYPES, 'Other'
     )
-    
-    # Determine status
-    status_map = {
-        'exe': 'Ready for Work',
-        'apc': 'Wait for Spare Parts', 
-        'ter': 'Completed',
-        'ini': 'Initiated'
-    }
-    
-    df['status'] = df['ETATJOB'].str.lower().map(status_map).fillna('Pending')
-    
-    # Calculate time periods
-    df['month'] = df['creation_date'].apply(get_month_from_date)
-    df['quarter'] = df['creation_date'].apply(get_quarter_from_date)
-    df['year'] = df['creation_date'].apply(get_year_from_date)
-    
+    df['status'] = _categorical_from_distinct(
+        df['ETATJOB'], get_status, STATUS_CATEGORIES, 'Pending'
+    )
+
+    # Calculate time periods (missing when creation_date is NaT)
+    df['month'] = _period_labels(df['creation_date'], 'M', '%Y-%m')
+    df['quarter'] = _period_labels(df['creation_date'], 'Q', '%Y-Q%q')
+    df['year'] = _period_labels(df['creation_date'], 'Y', '%Y')
+
     # Determine failure causes and snag locations
-    df['failure_cause'] = df['combined_desc'].apply(classify_failure)
-    df['snag_location'] = df['combined_desc'].apply(find_snag_location)
-    
+    df['failure_cause'] = classify_failures(df['combined_desc']).astype('category')
+    df['snag_location'] = find_snag_locations(df['combined_desc']).astype('category')
+
     # Add breakdown location (if available)
     df['breakdown_location'] = df.get('Location', 'Unknown')
-    
+
     return df
 
+# Derived columns persisted alongside the raw work-order columns
+ENRICHED_COLUMNS = [
+    'failure_cause', 'snag_location', 'status', 'creation_date',
+    'execution_date', 'creation_ts', 'execution_ts', 'duration_days',
+    'month', 'quarter', 'year', 'equipment_type'
+]
+
+# Bumped when enrichment code changes in a way the rules fingerprinted by
+# rules_version do not show (2: ETATJOB codes are stripped before lookup)
+ENRICHMENT_REVISION = 2
+
+# Format used to store creation_date/execution_date as TEXT
+STORAGE_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Stored integer timestamps and the parsed date column each is taken from
+TIMESTAMP_COLUMNS = {
+    'creation_ts': 'creation_date',
+    'execution_ts': 'execution_date'
+}
+
+def epoch_seconds(dates):
+    """Return a datetime Series as nullable integer seconds since 1970-01-01"""
+    seconds = dates.to_numpy(dtype='datetime64[s]').view('int64')
+    return pd.Series(seconds, index=dates.index, dtype='Int64').mask(dates.isna())
+
+def rules_version():
+    """
+    Return a short fingerprint of the enrichment rules
+    Persisted rows stamped with a different version are stale and must be
+    re-enriched.
+    """
+    global _rules_version
+    if _rules_version is None:
+        fingerprint = repr((
+            _failure_engine[0], _SNAG_PATTERN.pattern, SNAG_LOCATIONS,
+            STATUS_MAP, EQUIPMENT_TYPES, DATE_FORMATS, ENRICHED_COLUMNS,
+            ENRICHMENT_REVISION
+        ))
+        _rules_version = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:12]
+    return _rules_version
+
+def enrich_for_storage(data, date_formats=None, parsed_dates=None):
+    """
+    Enrich work orders for persistence
+    Args:
+        data: DataFrame of raw workorder columns
+        date_formats: {column: format} for the date columns, so that every
+            batch of a table parses ambiguous dates the same way
+        parsed_dates: date columns already parsed (see parse_workorder_dates)
+    Returns:
+        DataFrame of the raw columns plus ENRICHED_COLUMNS (as SQLite-ready
+        values) and the rules_version they were computed with
+    """
+    raw = data.drop(columns=[c for c in ENRICHED_COLUMNS + ['rules_version'] if c in data])
+    processed = process_workorders(raw, date_formats, parsed_dates)
+
+    stored = raw.copy(deep=False)
+    for column in ENRICHED_COLUMNS:
+        if column in TIMESTAMP_COLUMNS:
+            stored[column] = epoch_seconds(processed[TIMESTAMP_COLUMNS[column]])
+            continue
+        values = processed[column]
+        if column in ('creation_date', 'execution_date'):
+            values = values.dt.strftime(STORAGE_DATE_FORMAT)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        stored[column] = values
+    stored['rules_version'] = rules_version()
+    return stored
+
+# Parallel enrichment: worker processes (DASHBOARD_ENRICH_WORKERS, default one
+# per core), rows per task, and the frame size below which it stays in-process
+ENRICH_WORKERS = int(os.environ.get('DASHBOARD_ENRICH_WORKERS', 0)) or os.cpu_count() or 1
+ENRICH_TASK_ROWS = 20000
+PARALLEL_ENRICH_MIN_ROWS = 40000
+
+# Raw columns process_workorders reads; only these are sent to the workers
+ENRICH_INPUT_COLUMNS = ['WO_name', 'Description', 'Order_date', 'Start_dt',
+                        'Jobexec_dt', 'Equipement', 'ETATJOB']
+
+_enrich_pool = None
+_enrich_pool_lock = threading.Lock()
+
+def _enrich_task(rules, columns, date_formats, dates=None):
+    """
+    Worker process entry point: enrich one chunk
+    Args:
+        rules: failure rules active in the parent process
+        columns: dict of input column name -> numpy array
+        date_formats: {column: format} for the date columns
+        dates: dict of already parsed date column name -> datetime64 array
+    Returns:
+        Dict of ENRICHED_COLUMNS name -> (numpy array, pandas dtype)
+    """
+    if rules != _failure_engine[0]:
+        set_failure_rules(rules)
+    parsed_dates = {column: pd.Series(values) for column, values in (dates or {}).items()}
+    stored = enrich_for_storage(pd.DataFrame(columns), date_formats, parsed_dates)
+    return {column: (stored[column].to_numpy(), stored[column].dtype) for column in ENRICHED_COLUMNS}
+
+def enrich_pool():
+    """
+    Return the shared enrichment process pool of ENRICH_WORKERS processes
+    The pool is never resized: callers wanting fewer processes limit their
+    tasks in flight instead, so one call cannot break another's pool.
+    """
+    global _enrich_pool
+    with _enrich_pool_lock:
+        if _enrich_pool is None:
+            # Spawned, not forked: the server process runs threads that may
+            # hold locks at fork time
+            _enrich_pool = ProcessPoolExecutor(
+                max_workers=ENRICH_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _enrich_pool
+
+def shutdown_enrich_pool():
+    """Stop the enrichment worker processes, if started"""
+    global _enrich_pool
+    with _enrich_pool_lock:
+        if _enrich_pool is not None:
+            _enrich_pool.shutdown()
+            _enrich_pool = None
+
+def enrich_for_storage_parallel(data, workers=None, min_rows=PARALLEL_ENRICH_MIN_ROWS,
+                                task_rows=ENRICH_TASK_ROWS, date_formats=None, parsed_dates=None):
+    """
+    Enrich work orders for persistence across a pool of worker processes
+    Only ENRICH_INPUT_COLUMNS go to the workers, as plain column arrays, and
+    only ENRICHED_COLUMNS come back; chunks are reassembled in order. Frames
+    smaller than min_rows, or a single worker, use enrich_for_storage.
+    Args:
+        data: DataFrame of raw workorder columns
+        workers: tasks run at once (default and at most ENRICH_WORKERS)
+        min_rows: crossover size for going parallel
+        task_rows: rows per worker task
+        date_formats: {column: format} for the date columns; inferred once
+            from the whole frame when not given, never per task
+        parsed_dates: date columns already parsed (see parse_workorder_dates);
+            workers get these instead of the raw date strings
+    Returns:
+        Same as enrich_for_storage
+    """
+    workers = min(workers or ENRICH_WORKERS, ENRICH_WORKERS)
+    if workers <= 1 or len(data) < min_rows:
+        return enrich_for_storage(data, date_formats, parsed_dates)
+
+    raw = data.drop(columns=[c for c in ENRICHED_COLUMNS + ['rules_version'] if c in data])
+    dates = {column: values.reindex(raw.index).to_numpy()
+             for column, values in (parsed_dates or {}).items()}
+    inputs = [column for column in ENRICH_INPUT_COLUMNS if column in raw and column not in dates]
+    # At least one task per worker, none larger than task_rows
+    tasks = max(workers, -(-len(raw) // task_rows))
+    bounds = np.linspace(0, len(raw), tasks + 1, dtype=int)
+    rules = _failure_engine[0]
+    date_formats = infer_date_formats(raw, date_formats)
+    started = datetime.now()
+    pool = enrich_pool()
+    # Keep at most `workers` tasks in flight, collecting results in order
+    results = []
+    in_flight = deque()
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if len(in_flight) == workers:
+            results.append(in_flight.popleft().result())
+        in_flight.append(pool.submit(
+            _enrich_task, rules, {column: raw[column].to_numpy()[start:end] for column in inputs},
+            date_formats, {column: values[start:end] for column, values in dates.items()}))
+    results.extend(future.result() for future in in_flight)
+
+    stored = raw.copy(deep=False)
+    for column in ENRICHED_COLUMNS:
+        values = np.concatenate([result[column][0] for result in results])
+        stored[column] = pd.Series(values, index=raw.index, dtype=results[0][column][1])
+    stored['rules_version'] = rules_version()
+    logging.info(f"Enriched {len(raw)} workorders in {tasks} tasks on {workers} "
+                 f"processes in {(datetime.now() - started).total_seconds():.2f}s")
+    return stored
+
+def _blank(values):
+    """Return a mask of missing or whitespace-only values"""
+    return values.isna() | (values.astype(str).str.strip() == '')
+
+def workorder_keys(values):
+    """
+    Return WO_key values in their stored text form, missing values kept missing
+    Integral keys read as floats (because of blanks) match stored text keys.
+    """
+    if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+        values = values.astype('Int64')
+    return values.astype(str).str.strip().where(values.notna())
+
+def validate_workorders(df, date_formats=None):
+    """
+    Check uploaded work orders column-wise, without per-row Python
+    A row fails for a missing WO_key, a date that does not parse, an ETATJOB
+    code outside STATUS_MAP, or a WO_key repeated by a later row of the frame
+    that passes the other checks: the last valid row wins, as in an upsert,
+    where a later chunk of the same upload replaces an earlier one.
+    Args:
+        df: DataFrame of raw workorder columns
+        date_formats: {column: format} for the date columns
+    Returns:
+        (reasons, dates) where reasons is a Series of '; '-joined failure
+        reasons indexed like df ('' when valid) and dates holds the parsed
+        date columns, to pass on as parsed_dates when enriching
+    """
+    checks = [('missing WO_key', _blank(df['WO_key']))]
+
+    dates = {}
+    for column in DATE_COLUMNS:
+        if column in df:
+            dates[column], _ = parse_date_column(df[column], date_format=(date_formats or {}).get(column))
+            checks.append((f'unparseable {column}', ~_blank(df[column]) & dates[column].isna()))
+
+    if 'ETATJOB' in df:
+        codes = df['ETATJOB'].astype(str).str.strip().str.lower()
+        checks.append(('unknown ETATJOB', ~_blank(df['ETATJOB']) & ~codes.isin(STATUS_MAP)))
+
+    # Only rows that would be written compete for a key
+    valid = ~np.logical_or.reduce([failed.to_numpy() for _, failed in checks])
+    keys = workorder_keys(df['WO_key'])
+    checks.append(('duplicate WO_key', valid & keys.where(valid).duplicated(keep='last')))
+
+    reasons = pd.Series('', index=df.index, dtype=object)
+    for label, failed in checks:
+        if failed.any():
+            reasons = reasons.mask(failed, reasons + label + '; ')
+    return reasons.str.rstrip('; '), dates
+
+def hash_rows(df, columns):
+    """
+    Return a stable int64 hash of the given columns for each row
+    Used to detect which uploaded rows differ from the stored ones.
+    """
+    text = df[columns].fillna('').astype(str)
+    return pd.util.hash_pandas_object(text, index=False).to_numpy().view('int64')
+
 # Example usage:
 if __name__ == "__main__":
     # Load sample data